@@ -0,0 +1,91 @@
+"""carga concorrente na API: vazão e latência de cauda nos modos sync e async
+
+Sobe um uvicorn por modo (TESOURO_API_MODE=sync|async, cache de respostas
+desligado para medir o caminho até o banco) e dispara requisições GET com
+50..500 clientes simultâneos.
+
+uso: python -m benchmarks.bench_carga [--requisicoes 2000] [--clientes 50,100,250,500]
+     python -m benchmarks.bench_carga --url http://127.0.0.1:8000   # servidor já em execução
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import subprocess
+import httpx
+
+ROTAS = [
+    "/titulo_tesouro/3?data_inicio=2010-01-01",
+    "/titulo_tesouro/1?group_by=ano",
+    "/titulo_tesouro/comparar?ids=1,2,3&data_inicio=2014-01-01",
+    "/titulos_tesouro/venda/2",
+    "/titulos_tesouro/resgate/4?group_by=ano",
+]
+
+async def _rodada(url: str, clientes: int, requisicoes: int) -> dict:
+    latencias, erros = [], 0
+    fila = iter(range(requisicoes))
+    limites = httpx.Limits(max_connections=clientes, max_keepalive_connections=clientes)
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=60) as client:
+        async def cliente():
+            nonlocal erros
+            for i in fila:
+                t0 = time.perf_counter()
+                try:
+                    r = await client.get(ROTAS[i % len(ROTAS)])
+                    erros += r.status_code != 200
+                except httpx.HTTPError:
+                    erros += 1
+                latencias.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        await asyncio.gather(*(cliente() for _ in range(clientes)))
+        total = time.perf_counter() - t0
+    latencias.sort()
+    pct = lambda p: latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000
+    return {"rps": requisicoes / total, "p50": pct(0.50), "p95": pct(0.95), "p99": pct(0.99), "erros": erros}
+
+def _subir(modo: str, porta: int) -> subprocess.Popen:
+    env = {**os.environ, "TESOURO_API_MODE": modo, "TESOURO_CACHE_MAX": "0"}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.api:app", "--port", str(porta), "--log-level", "warning"],
+        env=env,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{porta}/cache/stats", timeout=0.5)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"uvicorn ({modo}) não subiu na porta {porta}")
+
+def _executar(url: str, nome: str, clientes: list, requisicoes: int):
+    asyncio.run(_rodada(url, 10, 200))  # aquecimento
+    for n in clientes:
+        r = asyncio.run(_rodada(url, n, requisicoes))
+        print(f"{nome:<6} {n:>8} {r['rps']:>10.0f} {r['p50']:>9.1f} {r['p95']:>9.1f} {r['p99']:>9.1f} {r['erros']:>6}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url")
+    parser.add_argument("--requisicoes", type=int, default=2000)
+    parser.add_argument("--clientes", default="50,100,250,500")
+    parser.add_argument("--porta", type=int, default=8765)
+    args = parser.parse_args()
+    clientes = [int(c) for c in args.clientes.split(",")]
+
+    print(f"{'modo':<6} {'clientes':>8} {'req/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'erros':>6}")
+    if args.url:
+        _executar(args.url, "-", clientes, args.requisicoes)
+        return
+    for modo in ("sync", "async"):
+        proc = _subir(modo, args.porta)
+        try:
+            _executar(f"http://127.0.0.1:{args.porta}", modo, clientes, args.requisicoes)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""leituras agregadas: resumos no SQLite (ORM) x DuckDB sobre o dataset Parquet, por tamanho da base
+
+Gera bases sintéticas com N títulos x A anos de histórico mensal (venda e resgate), grava o
+SQLite (movimentos + resumos) e o dataset Parquet particionado, e mede a mediana das consultas
+dos endpoints agregados nos dois motores, apontando o vencedor de cada tamanho (o ponto de virada).
+
+uso: python -m benchmarks.bench_duckdb [repeticoes] [titulos,...] [anos,...]
+ex.: python -m benchmarks.bench_duckdb 20 6,30,120 20,80
+"""
+import os
+import sys
+import time
+import tempfile
+from datetime import date
+import pandas as pd
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+from src.database import Base
+from src.models import Movimento
+from src.rollups import refresh_rollups, ler_mensal, ler_anual, ler_agregado
+from src.pipeline import _registros
+from src.duckdb_store import DuckDBStore
+from src import dataset
+from benchmarks.sintetico import movimentos, ANO_FIM
+
+def _montar(tmp: str, df: pd.DataFrame):
+    eng = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+    Base.metadata.create_all(eng, tables=[Movimento.__table__, *(t for n, t in Base.metadata.tables.items() if n.startswith("titulos_resumo"))])
+    with eng.begin() as conn:
+        conn.execute(insert(Movimento.__table__), _registros(df))
+        refresh_rollups(conn)
+    raiz = os.path.join(tmp, "dataset")
+    dataset.escrever(df, substituir=True, raiz=raiz)
+    return eng, DuckDBStore(fonte="parquet", raiz=raiz)
+
+def _mediana(fn, repeticoes: int) -> float:
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        fn()
+        tempos.append(time.perf_counter() - t0)
+    return sorted(tempos)[len(tempos) // 2] * 1000
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    titulos = [int(x) for x in sys.argv[2].split(",")] if len(sys.argv) > 2 else [6, 30, 120]
+    anos = [int(x) for x in sys.argv[3].split(",")] if len(sys.argv) > 3 else [20, 80]
+    print(f"{'títulos':>7} {'anos':>5} {'consulta':<36} {'sqlite (ms)':>12} {'duckdb (ms)':>12}  vencedor")
+    for a in anos:
+        for n in titulos:
+            df = movimentos(n, a)
+            todos = list(range(1, n + 1))
+            intervalo = (date(ANO_FIM - a + 2, 3, 1), date(ANO_FIM - 1, 9, 30))
+            consultas = [
+                ("comparar anual, todos, intervalo", "anual", (todos, *intervalo)),
+                ("comparar mensal, 2 títulos", "mensal", ([1, 2],)),
+                ("histórico trimestral, 1 título", "agregado", ([1], "trimestre")),
+                ("histórico anual, 1 título, intervalo", "agregado", ([1], "ano", *intervalo)),
+            ]
+            sql = {"anual": ler_anual, "mensal": ler_mensal, "agregado": ler_agregado}
+            with tempfile.TemporaryDirectory() as tmp:
+                eng, duck = _montar(tmp, df)
+                with Session(eng) as db:
+                    for nome, tipo, args in consultas:
+                        assert len(sql[tipo](db, *args)) == len(getattr(duck, tipo)(*args)), nome
+                        t_sql = _mediana(lambda: sql[tipo](db, *args), repeticoes)
+                        t_duck = _mediana(lambda: getattr(duck, tipo)(*args), repeticoes)
+                        print(f"{n:>7} {a:>5} {nome:<36} {t_sql:>12.2f} {t_duck:>12.2f}  {'duckdb' if t_duck < t_sql else 'sqlite'}")
+                eng.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""tempo de leitura do Excel: caminho antigo (2 aberturas + openpyxl) x leitura única x cache Parquet
+
+uso: python -m benchmarks.bench_excel [caminho.xlsx] [repeticoes]
+"""
+import os
+import sys
+import time
+import pandas as pd
+from src.pipeline import EXCEL_PATH
+from src.utils import read_excel_sheet, read_and_transform_excel, excel_engine, _cache_path
+
+def _legado(path):
+    xls = pd.ExcelFile(path)
+    return pd.read_excel(path, sheet_name=xls.sheet_names[0])
+
+def _cronometra(fn, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        fn()
+        tempos.append(time.perf_counter() - t0)
+    return min(tempos)
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else EXCEL_PATH
+    repeticoes = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    def sem_cache():
+        read_excel_sheet(path, cache=False)
+
+    def com_cache():
+        read_excel_sheet(path)
+
+    def transform():
+        read_and_transform_excel(path)
+
+    print(f"{'legado (ExcelFile + read_excel, openpyxl)':<45} {_cronometra(lambda: _legado(path), repeticoes) * 1000:10.2f} ms")
+    print(f"{'leitura única (' + excel_engine() + ')':<45} {_cronometra(sem_cache, repeticoes) * 1000:10.2f} ms")
+    if os.path.exists(_cache_path(path)):
+        os.remove(_cache_path(path))
+    print(f"{'cache parquet (miss: parse + escrita)':<45} {_cronometra(com_cache, 1) * 1000:10.2f} ms")
+    print(f"{'cache parquet (hit)':<45} {_cronometra(com_cache, repeticoes) * 1000:10.2f} ms")
+    print(f"{'read_and_transform_excel (hit)':<45} {_cronometra(transform, repeticoes) * 1000:10.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""parse + transformação de várias planilhas: sequencial x ProcessPoolExecutor
+
+Copia a planilha de exemplo N vezes num diretório temporário (como um histórico de
+cargas mensais) e mede `pipeline.ler_fontes` sem o cache Parquet, com 1..nº de núcleos processos.
+
+uso: python -m benchmarks.bench_ingestao [arquivos] [caminho.xlsx]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+from src.pipeline import EXCEL_PATH, resolver_fontes, tarefas_leitura, ler_fontes
+from src.utils import file_sha256
+
+def main():
+    n_arquivos = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    path = sys.argv[2] if len(sys.argv) > 2 else EXCEL_PATH
+    nucleos = os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(n_arquivos):
+            shutil.copy(path, os.path.join(tmp, f"tesouro_{i:03d}.xlsx"))
+        shas = {p: file_sha256(p) for p in resolver_fontes([tmp])}
+        tarefas = tarefas_leitura(shas)
+        print(f"{len(shas)} arquivos, {len(tarefas)} planilhas, {nucleos} núcleos")
+        print(f"{'processos':>9} {'tempo (s)':>10} {'planilhas/s':>12} {'linhas':>8}")
+        for workers in sorted({1, 2, nucleos}):
+            t0 = time.perf_counter()
+            df = ler_fontes(tarefas, workers, cache=False)
+            dt = time.perf_counter() - t0
+            print(f"{workers:>9} {dt:>10.2f} {len(tarefas) / dt:>12.1f} {len(df):>8}")
+
+if __name__ == "__main__":
+    main()
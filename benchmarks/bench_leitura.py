@@ -0,0 +1,47 @@
+"""latência das leituras agregadas: resumos no SQLite x ColumnarStore em memória
+
+uso: python -m benchmarks.bench_leitura [repeticoes]
+"""
+import sys
+import time
+from datetime import date
+from src.database import SessionLocal
+from src.rollups import ler_mensal, ler_anual
+from src.columnar import ColumnarStore
+
+CONSULTAS = [
+    ("mensal 1 título", "mensal", ([3],), {}),
+    ("mensal 1 título, 2015", "mensal", ([3], date(2015, 1, 1), date(2015, 12, 31)), {}),
+    ("mensal 6 títulos", "mensal", ([1, 2, 3, 4, 5, 6],), {}),
+    ("anual 6 títulos", "anual", ([1, 2, 3, 4, 5, 6],), {}),
+    ("anual 2 títulos, intervalo", "anual", ([1, 3], date(2010, 3, 15), date(2014, 6, 1)), {}),
+]
+
+def _percentis(tempos):
+    tempos = sorted(tempos)
+    return tempos[len(tempos) // 2], tempos[int(len(tempos) * 0.99) - 1]
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    store = ColumnarStore()
+    store.snapshot()
+    sql = {"mensal": ler_mensal, "anual": ler_anual}
+    print(f"{'consulta':<30} {'sql p50/p99 (µs)':>20} {'columnar p50/p99 (µs)':>24}")
+    for nome, tipo, args, kwargs in CONSULTAS:
+        with SessionLocal() as db:
+            assert [tuple(r) for r in sql[tipo](db, *args, **kwargs)] == getattr(store, tipo)(*args, **kwargs), nome
+            t_sql = []
+            for _ in range(repeticoes):
+                t0 = time.perf_counter()
+                sql[tipo](db, *args, **kwargs)
+                t_sql.append((time.perf_counter() - t0) * 1e6)
+        t_col = []
+        for _ in range(repeticoes):
+            t0 = time.perf_counter()
+            getattr(store, tipo)(*args, **kwargs)
+            t_col.append((time.perf_counter() - t0) * 1e6)
+        (s50, s99), (c50, c99) = _percentis(t_sql), _percentis(t_col)
+        print(f"{nome:<30} {s50:>9.0f} / {s99:<9.0f} {c50:>11.0f} / {c99:<10.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""tempo de serialização dos payloads de leitura por tamanho
+
+Compara o caminho padrão do FastAPI (dicts -> jsonable_encoder -> json.dumps) com os
+esquemas de src/schemas.py serializados pelo orjson, para comparação mensal com
+1..6 títulos e históricos de 1..100 anos.
+
+uso: python -m benchmarks.bench_serializacao [repeticoes]
+"""
+import sys
+import json
+import time
+from fastapi.encoders import jsonable_encoder
+from src.schemas import dumps
+from src.api_common import payload_comparar, payload_historico
+
+def _rows(n_titulos: int, n_meses: int) -> list:
+    return [(t, 2000 + m // 12, m % 12 + 1, 1_000_000.0 + m * 7.25, 250_000.5 + t) for m in range(n_meses) for t in range(1, n_titulos + 1)]
+
+def _dict(obj):
+    # o mesmo payload como dicts/listas simples (formato anterior aos esquemas)
+    if isinstance(obj, list):
+        return [_dict(x) for x in obj]
+    if hasattr(obj, "__slots__"):
+        return {k: _dict(getattr(obj, k)) for k in obj.__slots__}
+    return obj
+
+def _padrao(payload) -> bytes:
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def _medir(fn, payload, repeticoes: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeticoes):
+        fn(payload)
+    return (time.perf_counter() - t0) / repeticoes * 1e6
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    casos = [(f"comparar {t} títulos x {m} meses", payload_comparar(_rows(t, m), None)) for t, m in ((2, 12), (3, 240), (6, 1200))]
+    casos += [(f"historico {m} meses", payload_historico(3, "NTN-B", "mes", _rows(1, m))) for m in (12, 240, 1200)]
+    print(f"{'payload':<32} {'bytes':>9} {'padrão (µs)':>12} {'orjson (µs)':>12} {'ganho':>7}")
+    for nome, payload in casos:
+        como_dict = _dict(payload)
+        assert _padrao(como_dict) == dumps(payload), nome
+        t_padrao = _medir(_padrao, como_dict, repeticoes)
+        t_orjson = _medir(dumps, payload, repeticoes)
+        print(f"{nome:<32} {len(dumps(payload)):>9} {t_padrao:>12.0f} {t_orjson:>12.0f} {t_padrao / t_orjson:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
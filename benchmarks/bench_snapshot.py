@@ -0,0 +1,78 @@
+"""workers da API com cópia própria (columnar, lida do SQLite) x snapshot Arrow compartilhado (mmap)
+
+Monta uma base sintética (N títulos x A anos), publica o snapshot e sobe 1..W processos que
+carregam o store e consultam durante alguns segundos. Por motor e nº de processos mostra a subida
+(carga do store), a memória anônima que cada processo ganhou com os dados (a cópia columnar é
+privada; as páginas do snapshot são do page cache, compartilhadas) e a vazão somada.
+
+uso: python -m benchmarks.bench_snapshot [titulos] [anos] [processos,...] [segundos]
+ex.: python -m benchmarks.bench_snapshot 200 80 1,2,4 3
+"""
+import os
+import sys
+import time
+import tempfile
+import multiprocessing as mp
+from datetime import date
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.columnar import ColumnarStore
+from src.snapshot import SnapshotStore, publicar
+from benchmarks.sintetico import popular_banco, ANO_FIM
+
+def _anonima_kb() -> int:
+    with open("/proc/self/smaps_rollup") as f:
+        return next(int(l.split()[1]) for l in f if l.startswith("Anonymous:"))
+
+def _worker(motor: str, db_url: str, path: str, n_titulos: int, anos: int, segundos: float, inicio, fila):
+    fabrica = sessionmaker(bind=create_engine(db_url))
+    anon0 = _anonima_kb()
+    t0 = time.perf_counter()
+    store = ColumnarStore(fabrica) if motor == "columnar" else SnapshotStore(path, fabrica)
+    s = store.snapshot()
+    # toca todas as colunas (as páginas do mmap entram de fato no processo)
+    sum(int(getattr(s, c).sum()) for c in ("titulo_id", "mes_idx", "ano", "mes", "venda", "resgate", "n_venda", "n_resgate"))
+    carga = time.perf_counter() - t0
+    anon = _anonima_kb() - anon0
+    inicio.wait()
+    todos = list(range(1, n_titulos + 1))
+    intervalo = (date(ANO_FIM - anos + 2, 3, 1), date(ANO_FIM - 1, 9, 30))
+    n, fim = 0, time.perf_counter() + segundos
+    while time.perf_counter() < fim:
+        store.agregado([n % n_titulos + 1], "trimestre")
+        if n % 10 == 0:
+            store.anual(todos, *intervalo)
+        n += 1
+    fila.put((carga, anon, n / segundos))
+
+def main():
+    n_titulos = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    anos = int(sys.argv[2]) if len(sys.argv) > 2 else 80
+    processos = [int(x) for x in sys.argv[3].split(",")] if len(sys.argv) > 3 else [1, 2, 4]
+    segundos = float(sys.argv[4]) if len(sys.argv) > 4 else 3.0
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        popular_banco(db_url, n_titulos, anos)
+        eng = create_engine(db_url)
+        path = os.path.join(tmp, "snapshot.arrow")
+        t0 = time.perf_counter()
+        linhas = publicar(path, sessionmaker(bind=eng))
+        print(f"{n_titulos} títulos x {anos} anos: {linhas} linhas, snapshot {os.path.getsize(path) / 2**20:.1f} MiB "
+              f"publicado em {(time.perf_counter() - t0) * 1000:.0f} ms (CPUs: {os.cpu_count()})")
+        print(f"{'motor':<9} {'procs':>5} {'subida (ms)':>12} {'anon/proc (MiB)':>16} {'consultas/s':>12}")
+        for motor in ("columnar", "snapshot"):
+            for w in processos:
+                inicio, fila = ctx.Barrier(w), ctx.Queue()
+                procs = [ctx.Process(target=_worker, args=(motor, db_url, path, n_titulos, anos, segundos, inicio, fila)) for _ in range(w)]
+                for p in procs:
+                    p.start()
+                res = [fila.get() for _ in procs]
+                for p in procs:
+                    p.join()
+                carga = sorted(r[0] for r in res)[len(res) // 2] * 1000
+                anon = sorted(r[1] for r in res)[len(res) // 2] / 1024
+                print(f"{motor:<9} {w:>5} {carga:>12.1f} {anon:>16.1f} {sum(r[2] for r in res):>12.0f}")
+
+if __name__ == "__main__":
+    main()
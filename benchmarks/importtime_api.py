@@ -0,0 +1,54 @@
+"""orçamento de cold start da API: `python -X importtime -c "import src.api"` em processos novos
+
+Para cada modo (sync/async) mede a mediana do tempo cumulativo de import de `src.api`, lista os
+módulos mais caros e confere que o caminho de serviço não carrega pandas/NumPy/pyarrow (motor de
+leitura `sql`; `columnar` e `duckdb` carregam NumPy/pyarrow de propósito). Sai com código 1 se o
+orçamento estourar ou se algum módulo proibido aparecer.
+
+uso: python -m benchmarks.importtime_api [--repeticoes 5] [--orcamento-ms 1500]
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+PROIBIDOS = ("pandas", "numpy", "pyarrow", "duckdb")
+
+def _importtime(modo: str) -> dict:
+    """módulo -> (self_us, cumulativo_us) de um `import src.api` num interpretador novo"""
+    env = {**os.environ, "TESOURO_API_MODE": modo, "TESOURO_READ_ENGINE": "sql"}
+    r = subprocess.run([sys.executable, "-X", "importtime", "-c", "import src.api"],
+                       env=env, capture_output=True, text=True, check=True)
+    tempos = {}
+    for linha in r.stderr.splitlines():
+        if not linha.startswith("import time:") or "self [us]" in linha:
+            continue
+        self_us, cum_us, nome = linha[len("import time:"):].split("|")
+        tempos[nome.strip()] = (int(self_us), int(cum_us))
+    return tempos
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--orcamento-ms", type=float, default=float(os.environ.get("TESOURO_IMPORT_ORCAMENTO_MS", "1500")))
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    falhou = False
+    for modo in ("sync", "async"):
+        rodadas = [_importtime(modo) for _ in range(args.repeticoes)]
+        total = statistics.median(r["src.api"][1] for r in rodadas) / 1000
+        proibidos = sorted({m.split(".")[0] for r in rodadas for m in r} & set(PROIBIDOS))
+        ok = total <= args.orcamento_ms and not proibidos
+        falhou |= not ok
+        print(f"{modo:<6} import src.api: {total:8.1f} ms (orçamento {args.orcamento_ms:.0f} ms) {'ok' if ok else 'ESTOUROU'}")
+        if proibidos:
+            print(f"       módulos proibidos no caminho de serviço: {', '.join(proibidos)}")
+        mais_caros = sorted(rodadas[-1].items(), key=lambda kv: kv[1][0], reverse=True)[:args.top]
+        for nome, (self_us, cum_us) in mais_caros:
+            print(f"       {self_us / 1000:8.1f} ms próprio {cum_us / 1000:8.1f} ms cumulativo  {nome}")
+    sys.exit(1 if falhou else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""roda a suíte pytest-benchmark e compara com a linha de base versionada em benchmarks/baseline
+
+A linha de base é por máquina (pasta <sistema>-<implementação>-<versão>-<bits>, a do pytest-benchmark)
+e por escala (BENCH_TITULOS x BENCH_ANOS x BENCH_MESES, no nome do arquivo): só faz sentido
+comparar execuções na mesma máquina e na mesma escala. Sai com código != 0 se algum caso ficar
+mais lento que a tolerância (mediana, em %; o padrão de 50% absorve o ruído de uma máquina compartilhada) ou se algum caso falhar.
+
+uso: python -m benchmarks.regressao                   # compara com a linha de base
+     python -m benchmarks.regressao --salvar          # grava nova linha de base (a comparação usa a mais recente)
+     python -m benchmarks.regressao --tolerancia 40 -- -k leitura   # argumentos extras vão ao pytest
+"""
+import os
+import sys
+import glob
+import argparse
+import pytest
+from pytest_benchmark.utils import get_machine_id
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(DIR, "baseline")
+
+def _escala() -> str:
+    return "x".join(os.environ.get(v, d) for v, d in (("BENCH_TITULOS", "50"), ("BENCH_ANOS", "50"), ("BENCH_MESES", "600")))
+
+def main():
+    parser = argparse.ArgumentParser(description="suíte de benchmarks com linha de base")
+    parser.add_argument("--salvar", action="store_true", help="grava a execução como nova linha de base")
+    parser.add_argument("--tolerancia", type=float, default=float(os.environ.get("BENCH_TOLERANCIA", "50")),
+                        help="piora máxima da mediana, em %% (padrão 50)")
+    parser.add_argument("pytest_args", nargs="*")
+    args = parser.parse_args()
+
+    nome = f"baseline-{_escala()}"
+    base = ["-p", "no:cacheprovider", "-o", "python_files=bench_*.py", os.path.join(DIR, "suite"),
+            f"--benchmark-storage=file://{BASELINE}", "--benchmark-columns=median,iqr,ops,rounds",
+            "--benchmark-sort=name", "--benchmark-warmup=on", *args.pytest_args]
+    if args.salvar:
+        return pytest.main([*base, f"--benchmark-save={nome}"])
+    # a mais recente desta máquina (o pytest-benchmark numera as gravações: 0001_, 0002_...)
+    anteriores = sorted(glob.glob(os.path.join(BASELINE, get_machine_id(), f"*_{nome}.json")))
+    if not anteriores:
+        print(f"sem linha de base para {get_machine_id()} na escala {_escala()}: rode com --salvar", file=sys.stderr)
+        return 2
+    return pytest.main([*base, f"--benchmark-compare={anteriores[-1]}",
+                        f"--benchmark-compare-fail=median:{args.tolerancia:g}%"])
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""gerador de dados sintéticos em escala: planilhas no formato largo do Tesouro e banco populado
+
+- `movimentos(n_titulos, anos)`: frame tidy no formato de `read_and_transform_excel`
+  (venda e resgate por título e mês), valores gama reprodutíveis pela seed;
+- `planilha(path, meses, n_titulos)`: xlsx no layout de Series_Temporais_Tesouro_Direto.xlsx
+  ("Nº", "Período" e uma coluna por série "Vendas/Resgates - Tesouro Direto - <categoria>", em R$ milhões);
+- `popular_banco(url, n_titulos, anos)`: esquema, títulos, movimentos e resumos num banco novo.
+
+Os títulos além dos 6 conhecidos se chamam SINT-0007, SINT-0008...: no banco eles viram linhas de
+`titulos` e a API os serve normalmente. Nas planilhas, o ETL só mapeia as categorias de
+TITULOS_ID_MAP, então as demais séries só pesam no parse. O volume que passa pelo melt cresce com
+`meses` e com o número de planilhas. O histórico vai até 2025 e pode começar em 1678 (limite do
+datetime64[ns]).
+
+uso: python -m benchmarks.sintetico --titulos 300 --anos 300 --db /tmp/sint.db --planilha /tmp/sint.xlsx --meses 3600
+"""
+import os
+import time
+import argparse
+from datetime import date
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert
+from src.database import make_engine, insert_stmt
+from src.models import Titulo, Movimento, Watermark
+from src.migrations import preparar_banco
+from src.pipeline import _registros
+from src.rollups import refresh_rollups
+from src.titulos import TITULOS_ID_MAP
+from src.utils import ACOES
+
+ANO_FIM = 2025
+_NOME_SERIE = ("Nome da série:\xa0{serie} - Tesouro Direto - {categoria}   Periodicidade:\xa0Mensal   "
+               "Fonte:\xa0Tesouro Nacional   Unidade:\xa0R$ (milhões)   Data de atualização:\xa001/01/2026")
+
+def categorias(n_titulos: int) -> list:
+    """nomes dos títulos 1..n: os conhecidos primeiro, depois SINT-<id>"""
+    conhecidos = sorted(TITULOS_ID_MAP, key=TITULOS_ID_MAP.get)
+    return (conhecidos + [f"SINT-{i:04d}" for i in range(len(conhecidos) + 1, n_titulos + 1)])[:n_titulos]
+
+def movimentos(n_titulos: int, anos: int, seed: int = 0, primeiro_titulo: int = 1) -> pd.DataFrame:
+    """frame tidy (titulo_id, categoria_titulo, periodo, ano, mes, acao, valor_milhoes, valor_reais)"""
+    rng = np.random.default_rng(seed + primeiro_titulo)
+    periodos = pd.date_range(f"{ANO_FIM - anos + 1}-01-01", f"{ANO_FIM}-12-01", freq="MS")
+    ids = np.arange(primeiro_titulo, primeiro_titulo + n_titulos)
+    n = n_titulos * len(periodos) * 2
+    titulo_id = np.repeat(ids, len(periodos) * 2)
+    periodo = pd.DatetimeIndex(np.tile(np.repeat(periodos.to_numpy(), 2), n_titulos))
+    nomes = categorias(int(ids[-1]))[primeiro_titulo - 1:]
+    valor_milhoes = np.round(rng.gamma(2.0, 5.0, n), 2)
+    return pd.DataFrame({
+        "titulo_id": titulo_id,
+        "categoria_titulo": pd.Categorical.from_codes(np.repeat(np.arange(n_titulos), len(periodos) * 2), categories=nomes),
+        "periodo": periodo,
+        "ano": periodo.year.to_numpy(dtype="int16"),
+        "mes": periodo.month.to_numpy(dtype="int8"),
+        "acao": pd.Categorical.from_codes(np.tile([0, 1], n // 2), categories=ACOES),
+        "valor_milhoes": valor_milhoes,
+        "valor_reais": valor_milhoes * 1_000_000,
+    })
+
+def planilha(path: str, meses: int, n_titulos: int = len(TITULOS_ID_MAP), seed: int = 0) -> str:
+    """grava o xlsx largo (uma linha por mês, uma coluna por série) terminando em dez/ANO_FIM"""
+    rng = np.random.default_rng(seed)
+    periodos = pd.date_range(end=f"{ANO_FIM}-12-01", periods=meses, freq="MS")
+    colunas = {"Nº ": np.arange(1, meses + 1), "Período": periodos}
+    for serie in ("Vendas", "Resgates"):
+        for categoria in categorias(n_titulos):
+            colunas[_NOME_SERIE.format(serie=serie, categoria=categoria)] = np.round(rng.gamma(2.0, 5.0, meses), 2)
+    pd.DataFrame(colunas).to_excel(path, index=False, engine="openpyxl")
+    return path
+
+def popular_banco(url: str, n_titulos: int, anos: int, seed: int = 0, titulos_por_lote: int = 50) -> int:
+    """cria o esquema e carrega títulos, movimentos, watermarks e resumos; devolve o nº de movimentos"""
+    eng = make_engine(url)
+    preparar_banco(eng)
+    total = 0
+    with eng.begin() as conn:
+        conn.execute(insert_stmt(Titulo.__table__).on_conflict_do_nothing(),
+                     [{"id": i, "categoria_titulo": nome} for i, nome in enumerate(categorias(n_titulos), 1)])
+        # em blocos de títulos: a memória não cresce com o total de linhas
+        for primeiro in range(1, n_titulos + 1, titulos_por_lote):
+            df = movimentos(min(titulos_por_lote, n_titulos - primeiro + 1), anos, seed, primeiro)
+            conn.execute(insert(Movimento.__table__), _registros(df))
+            total += len(df)
+        # watermarks como as de uma carga do ETL: o delta da próxima carga compara com o banco
+        conn.execute(insert(Watermark.__table__), [{"titulo_id": i, "ultimo_periodo": date(ANO_FIM, 12, 1)} for i in range(1, n_titulos + 1)])
+        refresh_rollups(conn)
+    eng.dispose()
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="dados sintéticos em escala para os benchmarks")
+    parser.add_argument("--titulos", type=int, default=300)
+    parser.add_argument("--anos", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", help="arquivo SQLite novo a popular")
+    parser.add_argument("--planilha", help="caminho do xlsx largo a gerar")
+    parser.add_argument("--meses", type=int, default=1200, help="linhas (meses) da planilha")
+    args = parser.parse_args()
+    if not (args.db or args.planilha):
+        parser.error("informe --db e/ou --planilha")
+    if args.db:
+        t0 = time.perf_counter()
+        n = popular_banco(f"sqlite:///{os.path.abspath(args.db)}", args.titulos, args.anos, args.seed)
+        print(f"{args.db}: {args.titulos} títulos x {args.anos} anos, {n} movimentos em {time.perf_counter() - t0:.1f} s")
+    if args.planilha:
+        t0 = time.perf_counter()
+        planilha(args.planilha, args.meses, args.titulos, args.seed)
+        print(f"{args.planilha}: {args.meses} meses x {2 * args.titulos} séries em {time.perf_counter() - t0:.1f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""stress de escrita concorrente no POST /titulo_tesouro: nenhum incremento pode se perder
+
+Sobe a API (sync e async) sobre uma cópia temporária de dados/data.db e dispara N POSTs
+de valor 1 na mesma chave (titulo, periodo, acao) a partir de muitos clientes simultâneos.
+No fim confere no banco que o movimento e os resumos mensal/anual subiram exatamente N.
+Sai com código 1 se algum incremento se perdeu.
+
+uso: python -m benchmarks.stress_add_valor [--requisicoes 2000] [--clientes 200]
+"""
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import asyncio
+import argparse
+import tempfile
+import httpx
+from benchmarks.bench_carga import _subir
+from src.database import DB_PATH
+
+CHAVE = {"categoria_titulo": "NTN-B", "ano": 2099, "mes": 1, "acao": "venda"}
+
+async def _disparar(url: str, clientes: int, requisicoes: int) -> int:
+    erros = 0
+    fila = iter(range(requisicoes))
+    limites = httpx.Limits(max_connections=clientes, max_keepalive_connections=clientes)
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=120) as client:
+        async def cliente():
+            nonlocal erros
+            for _ in fila:
+                try:
+                    r = await client.post("/titulo_tesouro", json={**CHAVE, "valor": 1})
+                    erros += r.status_code != 200
+                except httpx.HTTPError:
+                    erros += 1
+        await asyncio.gather(*(cliente() for _ in range(clientes)))
+    return erros
+
+def _valores(db_path: str) -> tuple:
+    with sqlite3.connect(db_path) as conn:
+        mov = conn.execute("SELECT valor_centavos FROM titulos_movimentos WHERE titulo_id = 3 AND periodo = '2099-01-01' AND acao = 'venda'").fetchone()
+        mensal = conn.execute("SELECT venda_centavos, n_venda FROM titulos_resumo_mensal WHERE titulo_id = 3 AND periodo = '2099-01-01'").fetchone()
+        anual = conn.execute("SELECT venda_centavos, n_venda FROM titulos_resumo_anual WHERE titulo_id = 3 AND ano = 2099").fetchone()
+    return mov, mensal, anual
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requisicoes", type=int, default=2000)
+    parser.add_argument("--clientes", type=int, default=200)
+    parser.add_argument("--porta", type=int, default=8766)
+    args = parser.parse_args()
+
+    falhou = False
+    print(f"{'modo':<6} {'req/s':>8} {'erros':>6} {'esperado':>9} {'movimento':>10} {'mensal':>8} {'anual':>8} {'n':>4}  (centavos)")
+    for modo in ("sync", "async"):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "data.db")
+            shutil.copy(DB_PATH, db_path)
+            os.environ["TESOURO_DB_URL"] = f"sqlite:///{db_path}"
+            proc = _subir(modo, args.porta)
+            try:
+                t0 = time.perf_counter()
+                erros = asyncio.run(_disparar(f"http://127.0.0.1:{args.porta}", args.clientes, args.requisicoes))
+                rps = args.requisicoes / (time.perf_counter() - t0)
+            finally:
+                proc.terminate()
+                proc.wait()
+            (valor,), (mensal, n_mes), (anual, n_ano) = _valores(db_path)
+        # cada POST soma R$ 1,00 = 100 centavos
+        esperado = (args.requisicoes - erros) * 100
+        ok = valor == mensal == anual == esperado and n_mes == n_ano == 1
+        falhou |= not ok
+        print(f"{modo:<6} {rps:>8.0f} {erros:>6} {esperado:>9} {valor:>10} {mensal:>8} {anual:>8} {n_mes:>4} {'ok' if ok else 'PERDA'}")
+    del os.environ["TESOURO_DB_URL"]
+    sys.exit(1 if falhou else 0)
+
+if __name__ == "__main__":
+    main()
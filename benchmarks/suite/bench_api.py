@@ -0,0 +1,64 @@
+"""endpoints da API em processo (TestClient sobre o app ASGI), sem cache de respostas
+
+O modo (TESOURO_API_MODE) e o motor de leitura (TESOURO_READ_ENGINE) são os do ambiente.
+"""
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from fastapi.testclient import TestClient
+from src.api import app
+from benchmarks.sintetico import ANO_FIM
+
+@pytest.fixture(scope="module")
+def client(dados):
+    with TestClient(app) as c:
+        yield c
+
+def _leituras(n_titulos: int) -> list:
+    todos = ",".join(str(i) for i in range(1, n_titulos + 1))
+    dez_anos = {"data_inicio": f"{ANO_FIM - 9}-01-01"}
+    return [
+        ("historico_mes", "/titulo_tesouro/3", {}),
+        ("historico_mes_10anos", "/titulo_tesouro/3", dez_anos),
+        ("historico_trimestre", "/titulo_tesouro/3", {"granularity": "trimestre"}),
+        ("historico_ano", "/titulo_tesouro/3", {"group_by": "ano"}),
+        ("historico_paginado", "/titulo_tesouro/3", {"limite": 100}),
+        ("historico_csv", "/titulo_tesouro/3", {"format": "csv"}),
+        ("comparar_mes_2", "/titulo_tesouro/comparar", {"ids": "1,3"}),
+        ("comparar_mes_todos_10anos", "/titulo_tesouro/comparar", {"ids": todos, **dez_anos}),
+        ("comparar_ano_todos", "/titulo_tesouro/comparar", {"ids": todos, "group_by": "ano"}),
+        ("comparar_ndjson_todos_10anos", "/titulo_tesouro/comparar", {"ids": todos, "format": "ndjson", **dez_anos}),
+        ("venda_mes", "/titulos_tesouro/venda/2", {}),
+        ("resgate_ano", "/titulos_tesouro/resgate/2", {"group_by": "ano"}),
+        ("indicadores_mes", "/titulo_tesouro/4/indicadores", {}),
+        ("indicadores_ano", "/titulo_tesouro/4/indicadores", {"granularity": "ano"}),
+        ("cache_stats", "/cache/stats", {}),
+    ]
+
+LEITURAS = _leituras(int(__import__("os").environ.get("BENCH_TITULOS", "50")))
+
+@pytest.mark.parametrize("rota,params", [(r, p) for _, r, p in LEITURAS], ids=[n for n, _, _ in LEITURAS])
+def test_leitura(benchmark, client, rota, params):
+    r = benchmark(client.get, rota, params=params)
+    assert r.status_code == 200
+
+def test_post(benchmark, client):
+    corpo = {"categoria_titulo": "NTN-B", "mes": 1, "ano": ANO_FIM + 1, "acao": "venda", "valor": 1}
+    assert benchmark(client.post, "/titulo_tesouro", json=corpo).status_code == 200
+
+def test_patch(benchmark, client):
+    item_id = client.post("/titulo_tesouro", json={"categoria_titulo": "LTN", "mes": 2, "ano": ANO_FIM + 1, "acao": "venda", "valor": 1}).json()["item_id"]
+    assert benchmark(client.patch, f"/titulo_tesouro/{item_id}", json={"valor": 2}).status_code == 200
+
+def test_delete(benchmark, client):
+    def criar():
+        r = client.post("/titulo_tesouro", json={"categoria_titulo": "LFT", "mes": 3, "ano": ANO_FIM + 1, "acao": "resgate", "valor": 1})
+        return (f"/titulo_tesouro/{r.json()['item_id']}",), {}
+    r = benchmark.pedantic(client.delete, setup=criar, rounds=50)
+    assert r.status_code == 200
+
+@pytest.mark.parametrize("itens", [100, 5000])
+def test_batch(benchmark, client, itens):
+    lote = [{"categoria_titulo": "NTN-F", "mes": i % 12 + 1, "ano": ANO_FIM + 1 + i // 12, "acao": "venda", "valor": 1} for i in range(itens)]
+    assert benchmark(client.post, "/titulo_tesouro/batch", json=lote).status_code == 200
@@ -0,0 +1,52 @@
+"""etapas do ETL sobre a base e a planilha sintéticas"""
+import os
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from src import dataset, snapshot
+from src.database import engine, SessionLocal
+from src.rollups import refresh_rollups
+from src.utils import read_excel_sheet, read_and_transform_excel
+from src.pipeline import init_db, upsert_movimentos, delta_movimentos
+from benchmarks.sintetico import movimentos
+
+@pytest.fixture(scope="module")
+def frame(dados):
+    # mesmas chaves da base: o upsert atualiza em vez de inserir e o tamanho da base não muda entre rodadas
+    return movimentos(dados["titulos"], dados["anos"])
+
+def test_excel_parse(benchmark, dados):
+    df = benchmark.pedantic(read_excel_sheet, args=(dados["planilha"],), kwargs={"cache": False}, rounds=3)
+    assert len(df) == dados["meses"]
+
+def test_transformacao(benchmark, dados):
+    # cache Parquet da planilha já gravado: mede mapeamento das séries + melt
+    read_excel_sheet(dados["planilha"])
+    df = benchmark(read_and_transform_excel, dados["planilha"])
+    assert len(df) == dados["meses"] * 12
+
+def test_init_db(benchmark, dados):
+    benchmark(init_db)
+
+def test_delta(benchmark, frame):
+    # tudo abaixo da watermark e igual ao banco: mede a leitura + comparação completa
+    assert benchmark.pedantic(delta_movimentos, args=(frame,), rounds=3).empty
+
+def test_upsert(benchmark, frame):
+    res = benchmark.pedantic(upsert_movimentos, args=(frame,), rounds=3)
+    assert res["atualizados"] == len(frame)
+
+def test_rollups(benchmark, dados):
+    def refresh():
+        with engine.begin() as conn:
+            refresh_rollups(conn)
+    benchmark.pedantic(refresh, rounds=3)
+
+def test_parquet(benchmark, dados, frame):
+    raiz = os.path.join(dados["dir"], "dataset-bench")
+    assert benchmark.pedantic(dataset.escrever, args=(frame,), kwargs={"substituir": True, "raiz": raiz}, rounds=3) > 0
+
+def test_snapshot(benchmark, dados, frame):
+    path = os.path.join(dados["dir"], "snapshot-bench.arrow")
+    assert benchmark.pedantic(snapshot.publicar, args=(path, SessionLocal), rounds=3) >= len(frame) // 2
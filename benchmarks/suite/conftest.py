@@ -0,0 +1,43 @@
+"""fixtures da suíte pytest-benchmark: base sintética num diretório temporário
+
+As variáveis de ambiente precisam valer antes do primeiro import de `src` (o engine lê
+TESOURO_DB_URL no import), por isso são definidas aqui, no carregamento do conftest.
+Escala: BENCH_TITULOS, BENCH_ANOS (banco) e BENCH_MESES (planilha). BENCH_DIR mantém os dados
+gerados entre execuções; sem ele, a base é gerada e apagada a cada sessão.
+"""
+import os
+import shutil
+import tempfile
+import pytest
+
+ESCALA = {
+    "titulos": int(os.environ.get("BENCH_TITULOS", "50")),
+    "anos": int(os.environ.get("BENCH_ANOS", "50")),
+    "meses": int(os.environ.get("BENCH_MESES", "600")),
+}
+BENCH_DIR = os.environ.get("BENCH_DIR") or os.path.join(tempfile.gettempdir(), f"tesouro-bench-{os.getpid()}")
+DB_PATH = os.path.join(BENCH_DIR, f"bench-{ESCALA['titulos']}x{ESCALA['anos']}.db")
+
+# sempre na base sintética: a suíte grava no banco, no dataset e no snapshot
+os.environ.update({
+    "TESOURO_DB_URL": f"sqlite:///{DB_PATH}",
+    "TESOURO_DB_READ_URL": f"sqlite:///{DB_PATH}",
+    "TESOURO_DATASET_PATH": os.path.join(BENCH_DIR, "dataset"),
+    "TESOURO_SNAPSHOT_PATH": os.path.join(BENCH_DIR, "snapshot.arrow"),
+    # cache de respostas desligado: os casos da API medem o caminho até o banco
+    "TESOURO_CACHE_MAX": "0",
+})
+
+@pytest.fixture(scope="session")
+def dados():
+    """paths da base e da planilha sintéticas (geradas uma vez por sessão)"""
+    from benchmarks.sintetico import popular_banco, planilha
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    xlsx = os.path.join(BENCH_DIR, f"planilha-{ESCALA['meses']}.xlsx")
+    if not os.path.exists(DB_PATH):
+        popular_banco(os.environ["TESOURO_DB_URL"], ESCALA["titulos"], ESCALA["anos"])
+    if not os.path.exists(xlsx):
+        planilha(xlsx, ESCALA["meses"])
+    yield {"db": DB_PATH, "planilha": xlsx, "dir": BENCH_DIR, **ESCALA}
+    if not os.environ.get("BENCH_DIR"):
+        shutil.rmtree(BENCH_DIR, ignore_errors=True)
@@ -1,248 +1,255 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
-from pydantic import BaseModel, Field
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
 from typing import Optional
 from datetime import date
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from .database import get_db, Base, engine
-from .models import Titulo, Movimento
-from .utils import TITULOS_ID_MAP
-
-app = FastAPI(title="Tesouro Direto API", version="1.0.0")
-
-# garante que as tabelas existem
-Base.metadata.create_all(bind=engine)
-
-class MovimentoCreate(BaseModel):
-    categoria_titulo: str = Field(..., examples=["NTN-B"])
-    mes: int
-    ano: int
-    acao: str = Field(..., pattern="^(venda|resgate)$")
-    valor: float = Field(..., ge=0)
-
-class MovimentoUpdate(BaseModel):
-    mes: Optional[int] = None
-    ano: Optional[int] = None
-    acao: Optional[str] = Field(None, pattern="^(venda|resgate)$")
-    valor: float = Field(..., ge=0)
-
-def _first_day(ano:int, mes:int) -> date:
-    return date(ano, mes, 1)
-
-def _titulo_id_by_categoria(categoria: str) -> int:
-    if categoria not in TITULOS_ID_MAP:
-        raise HTTPException(status_code=400, detail=f"categoria_titulo inválida: {categoria}")
-    return TITULOS_ID_MAP[categoria]
+from .database import get_db, get_read_db, ReadSessionLocal
+from .models import Movimento, para_centavos
+from .migrations import preparar_banco
+from .rollups import aplicar_delta, ler_mensal, ler_anual, ler_agregado, ler_indicadores, stmt_agregado
+from .api_common import (
+    registry, store, cache, MovimentoCreate, MovimentoUpdate, first_day, titulo_id_by_categoria,
+    aplicar_update, filtro_duplicado, parse_ids, checar_titulo, invalidar, verificar_recarga, cached_response,
+    payload_comparar, payload_historico, payload_serie, payload_indicadores, LOTE_STREAM, checar_paginacao, inicio_apos,
+    limite_linhas, paginar, headers_pagina, resposta_tabular, LOTE_OPENAPI, corpo_lote, validar_lote,
+    stmt_existentes, stmt_upsert_lote, stmt_inserir_movimento, stmt_somar_movimento, params_upsert_lote, deltas_lote, resumo_lote,
+)
+from .formats import FORMATOS_RE, negociar_formato
+from .schemas import ORJSONResponse
+from .metricas import MetricasMiddleware, coletor
+
+# "sync" (def + Session no threadpool) ou "async" (async def + AsyncSession, ver api_async.py)
+API_MODE = os.environ.get("TESOURO_API_MODE", "sync")
+
+# DDL na subida (migrações + create_all); 0 quando o esquema é preparado à parte (`python -m src.migrations`)
+AUTO_MIGRAR = os.environ.get("TESOURO_AUTO_MIGRAR", "1") != "0"
+# latência, consultas SQL e instâncias ORM por rota em /metrics e no cabeçalho Server-Timing
+METRICAS = os.environ.get("TESOURO_METRICAS", "1") != "0"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if AUTO_MIGRAR:
+        preparar_banco()
+    registry.carregar()
+    yield
+
+app = FastAPI(title="Tesouro Direto API", version="1.0.0", lifespan=lifespan, default_response_class=ORJSONResponse)
+if METRICAS:
+    app.add_middleware(MetricasMiddleware)
+router = APIRouter()
+
+def _mensal(db: Session, *args, **kwargs):
+    return store.mensal(*args, **kwargs) if store else ler_mensal(db, *args, **kwargs)
+
+def _anual(db: Session, *args, **kwargs):
+    return store.anual(*args, **kwargs) if store else ler_anual(db, *args, **kwargs)
+
+def _agregado(db: Session, *args, **kwargs):
+    return store.agregado(*args, **kwargs) if store else ler_agregado(db, *args, **kwargs)
+
+def _indicadores(db: Session, *args, **kwargs):
+    return store.indicadores(*args, **kwargs) if store else ler_indicadores(db, *args, **kwargs)
+
+def _lotes(*args):
+    # sessão própria: a do Depends já foi fechada quando o corpo do streaming é enviado
+    if store:
+        yield store.agregado(*args)
+        return
+    with ReadSessionLocal() as db:
+        result = db.execute(stmt_agregado(*args), execution_options={"yield_per": LOTE_STREAM})
+        yield from result.partitions()
 
 # 1) POST - adicionar (soma ao existente)
-@app.post("/titulo_tesouro")
+@router.post("/titulo_tesouro")
 def add_valor(mov: MovimentoCreate, db: Session = Depends(get_db)):
     if mov.mes < 1 or mov.mes > 12:
         raise HTTPException(400, "mes deve ser 1..12")
-    periodo = _first_day(mov.ano, mov.mes)
-    titulo_id = _titulo_id_by_categoria(mov.categoria_titulo)
-
-    existing = db.query(Movimento).filter(
-        Movimento.titulo_id==titulo_id,
-        Movimento.periodo==periodo,
-        Movimento.acao==mov.acao
-    ).first()
-
-    if existing:
-        existing.valor_reais += float(mov.valor)
-        existing.valor_milhoes = existing.valor_reais / 1_000_000.0
-        db.commit()
-        db.refresh(existing)
-        return {"status":"ok","message":"valor somado ao movimento existente","item_id":existing.id}
-    else:
-        novo = Movimento(
-            titulo_id=titulo_id,
-            periodo=periodo,
-            ano=mov.ano,
-            mes=mov.mes,
-            acao=mov.acao,
-            valor_reais=float(mov.valor),
-            valor_milhoes=float(mov.valor)/1_000_000.0
-        )
-        db.add(novo)
+    periodo = first_day(mov.ano, mov.mes)
+    titulo_id = titulo_id_by_categoria(mov.categoria_titulo)
+    centavos = para_centavos(mov.valor)
+
+    # insere; se a chave já existe, soma com um UPDATE aditivo. O caminho tomado (e não o valor
+    # final, que pode ser 0) diz se o movimento é novo, e o resumo recebe a contagem exata
+    params = params_upsert_lote({(titulo_id, periodo, mov.acao): centavos})[0]
+    item_id = db.execute(stmt_inserir_movimento(), params).scalar()
+    criado = item_id is not None
+    if not criado:
+        item_id = db.execute(stmt_somar_movimento(), params).scalar_one()
+    aplicar_delta(db, titulo_id, periodo, mov.acao, centavos, int(criado))
+    db.commit()
+    invalidar(titulo_id)
+    if not criado:
+        return {"status":"ok","message":"valor somado ao movimento existente","item_id":item_id}
+    return {"status":"ok","message":"movimento criado","item_id":item_id}
+
+# 1b) POST - vários movimentos de uma vez (array JSON ou NDJSON), somados numa única transação
+@router.post("/titulo_tesouro/batch", openapi_extra=LOTE_OPENAPI)
+def add_valores_lote(itens: list = Depends(corpo_lote), db: Session = Depends(get_db)):
+    resultados, chaves, somas = validar_lote(itens)
+    existentes, ids = set(), {}
+    if somas:
+        existentes = {tuple(r) for r in db.execute(stmt_existentes(somas))} & somas.keys()
+        ids = {(t, p, a): id_ for id_, t, p, a, _ in db.execute(stmt_upsert_lote(), params_upsert_lote(somas))}
+        for stmt, params in deltas_lote(somas, existentes):
+            db.execute(stmt, params)
         db.commit()
-        db.refresh(novo)
-        return {"status":"ok","message":"movimento criado","item_id":novo.id}
+        invalidar(*{t for t, _, _ in somas})
+    return ORJSONResponse(resumo_lote(resultados, chaves, existentes, ids))
 
 # 2) DELETE - remover um movimento
-@app.delete("/titulo_tesouro/{id}")
+@router.delete("/titulo_tesouro/{id}")
 def delete_valor(id: int, db: Session = Depends(get_db)):
     obj = db.get(Movimento, id)
     if not obj:
         raise HTTPException(404, "movimento não encontrado")
+    aplicar_delta(db, obj.titulo_id, obj.periodo, obj.acao, -obj.valor_centavos, -1)
+    titulo_id = obj.titulo_id
     db.delete(obj)
     db.commit()
+    invalidar(titulo_id)
     return {"status":"ok","deleted_id":id}
 
 # 3) PUT/PATCH - atualizar (substitui)
-@app.put("/titulo_tesouro/{id}")
-@app.patch("/titulo_tesouro/{id}")
+@router.put("/titulo_tesouro/{id}")
+@router.patch("/titulo_tesouro/{id}")
 def update_valor(id: int, mov: MovimentoUpdate, db: Session = Depends(get_db)):
     obj = db.get(Movimento, id)
     if not obj:
         raise HTTPException(404, "movimento não encontrado")
+    anterior = (obj.titulo_id, obj.periodo, obj.acao, obj.valor_centavos)
+    aplicar_update(obj, mov)
 
-    if mov.valor is not None:
-        obj.valor_reais = float(mov.valor)
-        obj.valor_milhoes = obj.valor_reais / 1_000_000.0
-    if mov.acao is not None:
-        if mov.acao not in ("venda","resgate"):
-            raise HTTPException(400, "acao inválida")
-        obj.acao = mov.acao
-    if mov.ano is not None:
-        obj.ano = int(mov.ano)
-        obj.periodo = date(obj.ano, obj.mes, 1)
-    if mov.mes is not None:
-        if mov.mes < 1 or mov.mes > 12:
-            raise HTTPException(400, "mes deve ser 1..12")
-        obj.mes = int(mov.mes)
-        obj.periodo = date(obj.ano, obj.mes, 1)
-
-    # unicidade (titulo,periodo,acao)
-    dup = db.query(Movimento).filter(
-        Movimento.id != id,
-        Movimento.titulo_id == obj.titulo_id,
-        Movimento.periodo == obj.periodo,
-        Movimento.acao == obj.acao
-    ).first()
+    dup = db.query(Movimento).filter(*filtro_duplicado(id, obj)).first()
     if dup:
         raise HTTPException(409, "já existe um movimento para (titulo,periodo,acao)")
 
+    # move o valor antigo para fora do resumo e o novo para dentro
+    aplicar_delta(db, *anterior[:3], -anterior[3], -1)
+    aplicar_delta(db, obj.titulo_id, obj.periodo, obj.acao, obj.valor_centavos, 1)
     db.commit()
+    invalidar(obj.titulo_id)
     db.refresh(obj)
     return {"status":"ok","updated_id":id}
 
-# 4) GET - histórico de um título
-@app.get("/titulo_tesouro/{id_titulo}")
-def historico_titulo(
-    id_titulo: int,
+# 4) GET - comparar títulos (≥2)
+# (declarado antes de /titulo_tesouro/{id_titulo} para não ser capturado por ele)
+@router.get("/titulo_tesouro/comparar")
+def comparar_titulos(
+    request: Request,
+    ids: str,
     data_inicio: Optional[date] = None,
     data_fim: Optional[date] = None,
     group_by: Optional[str] = Query(None, pattern="^(ano)$"),
-    db: Session = Depends(get_db)
+    cursor: Optional[date] = None,
+    limite: Optional[int] = Query(None, ge=1, le=10000),
+    formato: Optional[str] = Query(None, alias="format", pattern=FORMATOS_RE),
+    db: Session = Depends(get_read_db)
 ):
-    titulo = db.get(Titulo, id_titulo)
-    if not titulo:
-        raise HTTPException(404, "titulo não encontrado")
-
-    q = db.query(Movimento).filter(Movimento.titulo_id==id_titulo)
-    if data_inicio: q = q.filter(Movimento.periodo >= data_inicio)
-    if data_fim: q = q.filter(Movimento.periodo <= data_fim)
-
+    ids_list = parse_ids(ids)
+    formato = negociar_formato(formato, request.headers.get("accept"))
+    granularidade = group_by or "mes"
+    checar_paginacao(granularidade, formato, cursor, limite)
+    inicio = inicio_apos(data_inicio, cursor)
+    verificar_recarga()
+    if formato != "json":
+        return resposta_tabular(formato, granularidade, _lotes(ids_list, granularidade, inicio, data_fim))
+    chave = ("comparar", tuple(sorted(set(ids_list))), inicio, data_fim, group_by, limite)
+    item = cache.get(chave)
+    if item:
+        return cached_response(request, item, "HIT")
+
+    proximo = None
     if group_by == "ano":
-        rows = db.query(
-            Movimento.ano,
-            func.sum(func.case((Movimento.acao=="venda", Movimento.valor_reais), else_=0)).label("valor_venda"),
-            func.sum(func.case((Movimento.acao=="resgate", Movimento.valor_reais), else_=0)).label("valor_resgate"),
-        ).filter(Movimento.titulo_id==id_titulo).group_by(Movimento.ano).all()
-        historico = [{"ano": r.ano, "valor_venda": r.valor_venda or 0.0, "valor_resgate": r.valor_resgate or 0.0} for r in rows]
+        rows = _anual(db, ids_list, inicio, data_fim)
     else:
-        rows = q.order_by(Movimento.periodo.asc()).all()
-        from collections import defaultdict
-        tmp = defaultdict(lambda: {"valor_venda":0.0, "valor_resgate":0.0, "ano":None, "mes":None})
-        for r in rows:
-            key = (r.ano, r.mes)
-            tmp[key]["ano"] = r.ano
-            tmp[key]["mes"] = r.mes
-            if r.acao=="venda":
-                tmp[key]["valor_venda"] += r.valor_reais
-            else:
-                tmp[key]["valor_resgate"] += r.valor_reais
-        historico = [{"ano":v["ano"], "mes":v["mes"], "valor_venda":v["valor_venda"], "valor_resgate":v["valor_resgate"]} for v in tmp.values()]
-        historico = sorted(historico, key=lambda x: (x["ano"], x["mes"]))
-
-    return {"id": titulo.id, "categoria_titulo": titulo.categoria_titulo, "historico": historico}
-
-# 5) GET - comparar títulos (≥2)
-@app.get("/titulo_tesouro/comparar")
-def comparar_titulos(
-    ids: str,
+        rows, proximo = paginar(_mensal(db, ids_list, inicio, data_fim, limite=limite_linhas(limite, ids_list)), limite)
+    payload = payload_comparar(rows, group_by)
+    return cached_response(request, cache.put(chave, chave[1], payload, headers_pagina(proximo)), "MISS")
+
+# 5) GET - histórico de um título
+@router.get("/titulo_tesouro/{id_titulo}")
+def historico_titulo(
+    request: Request,
+    id_titulo: int,
     data_inicio: Optional[date] = None,
     data_fim: Optional[date] = None,
     group_by: Optional[str] = Query(None, pattern="^(ano)$"),
-    db: Session = Depends(get_db)
+    granularity: Optional[str] = Query(None, pattern="^(mes|trimestre|semestre|ano)$"),
+    cursor: Optional[date] = None,
+    limite: Optional[int] = Query(None, ge=1, le=10000),
+    formato: Optional[str] = Query(None, alias="format", pattern=FORMATOS_RE),
+    db: Session = Depends(get_read_db)
 ):
-    ids_list = [int(x) for x in ids.split(",") if x.strip().isdigit()]
-    if not ids_list or len(ids_list) < 2:
-        raise HTTPException(400, "forneça ao menos dois ids")
-
-    if group_by == "ano":
-        rows = db.query(
-            Movimento.ano,
-            Movimento.titulo_id,
-            func.sum(func.case((Movimento.acao=="venda", Movimento.valor_reais), else_=0)).label("valor_venda"),
-            func.sum(func.case((Movimento.acao=="resgate", Movimento.valor_reais), else_=0)).label("valor_resgate"),
-        ).filter(Movimento.titulo_id.in_(ids_list))
-        if data_inicio: rows = rows.filter(Movimento.periodo >= data_inicio)
-        if data_fim: rows = rows.filter(Movimento.periodo <= data_fim)
-        rows = rows.group_by(Movimento.ano, Movimento.titulo_id).all()
-
-        by_year = {}
-        for ano, titulo_id, vv, vr in rows:
-            by_year.setdefault(ano, [])
-            categoria = db.get(Titulo, titulo_id).categoria_titulo
-            by_year[ano].append({"id": titulo_id, "categoria_titulo": categoria, "valor_venda": vv or 0.0, "valor_resgate": vr or 0.0})
-        payload = [{"ano": ano, "valores": arr} for ano, arr in sorted(by_year.items())]
-        return payload
-    else:
-        rows = db.query(Movimento).filter(Movimento.titulo_id.in_(ids_list))
-        if data_inicio: rows = rows.filter(Movimento.periodo >= data_inicio)
-        if data_fim: rows = rows.filter(Movimento.periodo <= data_fim)
-        rows = rows.order_by(Movimento.periodo.asc()).all()
-
-        from collections import defaultdict
-        acc = {}
-        for r in rows:
-            acc.setdefault((r.ano, r.mes), {})
-            d = acc[(r.ano, r.mes)].setdefault(r.titulo_id, {"id": r.titulo_id, "categoria_titulo": "", "valor_venda":0.0, "valor_resgate":0.0})
-            if r.acao=="venda":
-                d["valor_venda"] += r.valor_reais
-            else:
-                d["valor_resgate"] += r.valor_reais
-        payload = []
-        for (ano, mes), tit_map in sorted(acc.items()):
-            valores = []
-            for tid, dd in tit_map.items():
-                dd["categoria_titulo"] = db.get(Titulo, tid).categoria_titulo
-                valores.append(dd)
-            payload.append({"ano": ano, "mes": mes, "valores": valores})
-        return payload
+    # group_by=ano é atalho para granularity=ano
+    granularidade = granularity or group_by or "mes"
+    formato = negociar_formato(formato, request.headers.get("accept"))
+    checar_paginacao(granularidade, formato, cursor, limite)
+    inicio = inicio_apos(data_inicio, cursor)
+    verificar_recarga()
+    if formato != "json":
+        checar_titulo(id_titulo)
+        return resposta_tabular(formato, granularidade, _lotes([id_titulo], granularidade, inicio, data_fim))
+    chave = ("historico", id_titulo, inicio, data_fim, granularidade, limite)
+    item = cache.get(chave)
+    if item:
+        return cached_response(request, item, "HIT")
+
+    categoria = checar_titulo(id_titulo)
+    rows, proximo = paginar(_agregado(db, [id_titulo], granularidade, inicio, data_fim, limite=limite_linhas(limite, [id_titulo])), limite)
+    payload = payload_historico(id_titulo, categoria, granularidade, rows)
+    return cached_response(request, cache.put(chave, [id_titulo], payload, headers_pagina(proximo)), "MISS")
+
+# 5b) GET - indicadores derivados da série de um título (fluxo líquido, posição, 12 meses, variação anual, participação)
+@router.get("/titulo_tesouro/{id_titulo}/indicadores")
+def indicadores_titulo(
+    request: Request,
+    id_titulo: int,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    granularity: Optional[str] = Query(None, pattern="^(mes|trimestre|semestre|ano)$"),
+    db: Session = Depends(get_read_db)
+):
+    granularidade = granularity or "mes"
+    verificar_recarga()
+    chave = ("indicadores", id_titulo, data_inicio, data_fim, granularidade)
+    item = cache.get(chave)
+    if item:
+        return cached_response(request, item, "HIT")
+
+    categoria = checar_titulo(id_titulo)
+    rows = _indicadores(db, id_titulo, granularidade, data_inicio, data_fim)
+    payload = payload_indicadores(id_titulo, categoria, granularidade, rows)
+    # a participação depende do total de todos os títulos: qualquer escrita invalida
+    return cached_response(request, cache.put(chave, registry.por_id.keys(), payload), "MISS")
 
 # 6) GET - vendas por período
-@app.get("/titulos_tesouro/venda/{id_titulo}")
-def vendas_por_periodo(id_titulo: int, data_inicio: Optional[date]=None, data_fim: Optional[date]=None, group_by: Optional[str]=Query(None, pattern="^(ano)$"), db: Session=Depends(get_db)):
-    if not db.get(Titulo, id_titulo):
-        raise HTTPException(404, "titulo não encontrado")
-    q = db.query(Movimento).filter(Movimento.titulo_id==id_titulo, Movimento.acao=="venda")
-    if data_inicio: q = q.filter(Movimento.periodo >= data_inicio)
-    if data_fim: q = q.filter(Movimento.periodo <= data_fim)
-    if group_by=="ano":
-        rows = db.query(Movimento.ano, func.sum(Movimento.valor_reais)).filter(Movimento.titulo_id==id_titulo, Movimento.acao=="venda")
-        if data_inicio: rows = rows.filter(Movimento.periodo >= data_inicio)
-        if data_fim: rows = rows.filter(Movimento.periodo <= data_fim)
-        rows = rows.group_by(Movimento.ano).all()
-        return [{"ano": a, "valor_venda": v or 0.0} for a, v in rows]
-    rows = q.order_by(Movimento.periodo.asc()).all()
-    return [{"ano": r.ano, "mes": r.mes, "valor_venda": r.valor_reais} for r in rows]
+@router.get("/titulos_tesouro/venda/{id_titulo}")
+def vendas_por_periodo(id_titulo: int, data_inicio: Optional[date]=None, data_fim: Optional[date]=None, group_by: Optional[str]=Query(None, pattern="^(ano)$"), db: Session=Depends(get_read_db)):
+    checar_titulo(id_titulo)
+    ler = _anual if group_by == "ano" else _mensal
+    return ORJSONResponse(payload_serie(ler(db, [id_titulo], data_inicio, data_fim, acao="venda"), "venda", group_by))
 
 # 7) GET - resgates por período
-@app.get("/titulos_tesouro/resgate/{id_titulo}")
-def resgates_por_periodo(id_titulo: int, data_inicio: Optional[date]=None, data_fim: Optional[date]=None, group_by: Optional[str]=Query(None, pattern="^(ano)$"), db: Session=Depends(get_db)):
-    if not db.get(Titulo, id_titulo):
-        raise HTTPException(404, "titulo não encontrado")
-    q = db.query(Movimento).filter(Movimento.titulo_id==id_titulo, Movimento.acao=="resgate")
-    if data_inicio: q = q.filter(Movimento.periodo >= data_inicio)
-    if data_fim: q = q.filter(Movimento.periodo <= data_fim)
-    if group_by=="ano":
-        rows = db.query(Movimento.ano, func.sum(Movimento.valor_reais)).filter(Movimento.titulo_id==id_titulo, Movimento.acao=="resgate")
-        if data_inicio: rows = rows.filter(Movimento.periodo >= data_inicio)
-        if data_fim: rows = rows.filter(Movimento.periodo <= data_fim)
-        rows = rows.group_by(Movimento.ano).all()
-        return [{"ano": a, "valor_resgate": v or 0.0} for a, v in rows]
-    rows = q.order_by(Movimento.periodo.asc()).all()
-    return [{"ano": r.ano, "mes": r.mes, "valor_resgate": r.valor_reais} for r in rows]
+@router.get("/titulos_tesouro/resgate/{id_titulo}")
+def resgates_por_periodo(id_titulo: int, data_inicio: Optional[date]=None, data_fim: Optional[date]=None, group_by: Optional[str]=Query(None, pattern="^(ano)$"), db: Session=Depends(get_read_db)):
+    checar_titulo(id_titulo)
+    ler = _anual if group_by == "ano" else _mensal
+    return ORJSONResponse(payload_serie(ler(db, [id_titulo], data_inicio, data_fim, acao="resgate"), "resgate", group_by))
+
+# 8) GET - estatísticas do cache de respostas
+@app.get("/cache/stats")
+def cache_stats():
+    return cache.stats()
+
+# 9) GET - métricas por rota no formato texto do Prometheus (async: não disputa o threadpool)
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(coletor.prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+if API_MODE == "async":
+    from .api_async import router as async_router
+    app.include_router(async_router)
+else:
+    app.include_router(router)
@@ -0,0 +1,229 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from typing import Optional
+from datetime import date
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .database import get_async_db, get_async_read_db, get_async_sessionmaker
+from .models import Movimento, para_centavos
+from .rollups import stmts_delta, stmt_mensal, stmt_anual, stmt_agregado, stmt_indicadores
+from .api_common import (
+    registry, store, cache, MovimentoCreate, MovimentoUpdate, first_day, titulo_id_by_categoria,
+    aplicar_update, filtro_duplicado, parse_ids, checar_titulo, invalidar, verificar_recarga, cached_response,
+    payload_comparar, payload_historico, payload_serie, payload_indicadores, LOTE_STREAM, checar_paginacao, inicio_apos,
+    limite_linhas, paginar, headers_pagina, resposta_tabular, LOTE_OPENAPI, corpo_lote, validar_lote,
+    stmt_existentes, stmt_upsert_lote, stmt_inserir_movimento, stmt_somar_movimento, params_upsert_lote, deltas_lote, resumo_lote,
+)
+from .formats import FORMATOS_RE, negociar_formato
+from .schemas import ORJSONResponse
+
+# mesmos endpoints de api.py em async def + AsyncSession (TESOURO_API_MODE=async):
+# o event loop atende as requisições sem ocupar o threadpool do FastAPI
+router = APIRouter()
+
+async def _mensal(db: AsyncSession, *args, **kwargs):
+    if store:
+        return store.mensal(*args, **kwargs)
+    return (await db.execute(stmt_mensal(*args, **kwargs))).all()
+
+async def _anual(db: AsyncSession, *args, **kwargs):
+    if store:
+        return store.anual(*args, **kwargs)
+    return (await db.execute(stmt_anual(*args, **kwargs))).all()
+
+async def _agregado(db: AsyncSession, *args, **kwargs):
+    if store:
+        return store.agregado(*args, **kwargs)
+    return (await db.execute(stmt_agregado(*args, **kwargs))).all()
+
+async def _indicadores(db: AsyncSession, *args, **kwargs):
+    if store:
+        return store.indicadores(*args, **kwargs)
+    return (await db.execute(stmt_indicadores(*args, **kwargs))).all()
+
+async def _lotes(*args):
+    # sessão própria: a do Depends já foi fechada quando o corpo do streaming é enviado
+    if store:
+        yield store.agregado(*args)
+        return
+    async with get_async_sessionmaker(somente_leitura=True)() as db:
+        result = await db.stream(stmt_agregado(*args), execution_options={"yield_per": LOTE_STREAM})
+        async for part in result.partitions():
+            yield part
+
+async def _aplicar_delta(db: AsyncSession, *args):
+    for stmt, params in stmts_delta(*args):
+        await db.execute(stmt, params)
+
+# 1) POST - adicionar (soma ao existente)
+@router.post("/titulo_tesouro")
+async def add_valor(mov: MovimentoCreate, db: AsyncSession = Depends(get_async_db)):
+    if mov.mes < 1 or mov.mes > 12:
+        raise HTTPException(400, "mes deve ser 1..12")
+    periodo = first_day(mov.ano, mov.mes)
+    titulo_id = titulo_id_by_categoria(mov.categoria_titulo)
+    centavos = para_centavos(mov.valor)
+
+    # insere; se a chave já existe, soma com um UPDATE aditivo. O caminho tomado (e não o valor
+    # final, que pode ser 0) diz se o movimento é novo, e o resumo recebe a contagem exata
+    params = params_upsert_lote({(titulo_id, periodo, mov.acao): centavos})[0]
+    item_id = (await db.execute(stmt_inserir_movimento(), params)).scalar()
+    criado = item_id is not None
+    if not criado:
+        item_id = (await db.execute(stmt_somar_movimento(), params)).scalar_one()
+    await _aplicar_delta(db, titulo_id, periodo, mov.acao, centavos, int(criado))
+    await db.commit()
+    invalidar(titulo_id)
+    if not criado:
+        return {"status":"ok","message":"valor somado ao movimento existente","item_id":item_id}
+    return {"status":"ok","message":"movimento criado","item_id":item_id}
+
+# 1b) POST - vários movimentos de uma vez (array JSON ou NDJSON), somados numa única transação
+@router.post("/titulo_tesouro/batch", openapi_extra=LOTE_OPENAPI)
+async def add_valores_lote(itens: list = Depends(corpo_lote), db: AsyncSession = Depends(get_async_db)):
+    resultados, chaves, somas = validar_lote(itens)
+    existentes, ids = set(), {}
+    if somas:
+        existentes = {tuple(r) for r in await db.execute(stmt_existentes(somas))} & somas.keys()
+        ids = {(t, p, a): id_ for id_, t, p, a, _ in await db.execute(stmt_upsert_lote(), params_upsert_lote(somas))}
+        for stmt, params in deltas_lote(somas, existentes):
+            await db.execute(stmt, params)
+        await db.commit()
+        invalidar(*{t for t, _, _ in somas})
+    return ORJSONResponse(resumo_lote(resultados, chaves, existentes, ids))
+
+# 2) DELETE - remover um movimento
+@router.delete("/titulo_tesouro/{id}")
+async def delete_valor(id: int, db: AsyncSession = Depends(get_async_db)):
+    obj = await db.get(Movimento, id)
+    if not obj:
+        raise HTTPException(404, "movimento não encontrado")
+    titulo_id = obj.titulo_id
+    await _aplicar_delta(db, obj.titulo_id, obj.periodo, obj.acao, -obj.valor_centavos, -1)
+    await db.delete(obj)
+    await db.commit()
+    invalidar(titulo_id)
+    return {"status":"ok","deleted_id":id}
+
+# 3) PUT/PATCH - atualizar (substitui)
+@router.put("/titulo_tesouro/{id}")
+@router.patch("/titulo_tesouro/{id}")
+async def update_valor(id: int, mov: MovimentoUpdate, db: AsyncSession = Depends(get_async_db)):
+    obj = await db.get(Movimento, id)
+    if not obj:
+        raise HTTPException(404, "movimento não encontrado")
+    anterior = (obj.titulo_id, obj.periodo, obj.acao, obj.valor_centavos)
+    aplicar_update(obj, mov)
+
+    dup = (await db.execute(select(Movimento.id).where(*filtro_duplicado(id, obj)).limit(1))).first()
+    if dup:
+        raise HTTPException(409, "já existe um movimento para (titulo,periodo,acao)")
+
+    # move o valor antigo para fora do resumo e o novo para dentro
+    await _aplicar_delta(db, *anterior[:3], -anterior[3], -1)
+    await _aplicar_delta(db, obj.titulo_id, obj.periodo, obj.acao, obj.valor_centavos, 1)
+    await db.commit()
+    invalidar(obj.titulo_id)
+    return {"status":"ok","updated_id":id}
+
+# 4) GET - comparar títulos (≥2)
+@router.get("/titulo_tesouro/comparar")
+async def comparar_titulos(
+    request: Request,
+    ids: str,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    group_by: Optional[str] = Query(None, pattern="^(ano)$"),
+    cursor: Optional[date] = None,
+    limite: Optional[int] = Query(None, ge=1, le=10000),
+    formato: Optional[str] = Query(None, alias="format", pattern=FORMATOS_RE),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    ids_list = parse_ids(ids)
+    formato = negociar_formato(formato, request.headers.get("accept"))
+    granularidade = group_by or "mes"
+    checar_paginacao(granularidade, formato, cursor, limite)
+    inicio = inicio_apos(data_inicio, cursor)
+    verificar_recarga()
+    if formato != "json":
+        return resposta_tabular(formato, granularidade, _lotes(ids_list, granularidade, inicio, data_fim))
+    chave = ("comparar", tuple(sorted(set(ids_list))), inicio, data_fim, group_by, limite)
+    item = cache.get(chave)
+    if item:
+        return cached_response(request, item, "HIT")
+
+    proximo = None
+    if group_by == "ano":
+        rows = await _anual(db, ids_list, inicio, data_fim)
+    else:
+        rows, proximo = paginar(await _mensal(db, ids_list, inicio, data_fim, limite=limite_linhas(limite, ids_list)), limite)
+    payload = payload_comparar(rows, group_by)
+    return cached_response(request, cache.put(chave, chave[1], payload, headers_pagina(proximo)), "MISS")
+
+# 5) GET - histórico de um título
+@router.get("/titulo_tesouro/{id_titulo}")
+async def historico_titulo(
+    request: Request,
+    id_titulo: int,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    group_by: Optional[str] = Query(None, pattern="^(ano)$"),
+    granularity: Optional[str] = Query(None, pattern="^(mes|trimestre|semestre|ano)$"),
+    cursor: Optional[date] = None,
+    limite: Optional[int] = Query(None, ge=1, le=10000),
+    formato: Optional[str] = Query(None, alias="format", pattern=FORMATOS_RE),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    granularidade = granularity or group_by or "mes"
+    formato = negociar_formato(formato, request.headers.get("accept"))
+    checar_paginacao(granularidade, formato, cursor, limite)
+    inicio = inicio_apos(data_inicio, cursor)
+    verificar_recarga()
+    if formato != "json":
+        checar_titulo(id_titulo)
+        return resposta_tabular(formato, granularidade, _lotes([id_titulo], granularidade, inicio, data_fim))
+    chave = ("historico", id_titulo, inicio, data_fim, granularidade, limite)
+    item = cache.get(chave)
+    if item:
+        return cached_response(request, item, "HIT")
+
+    categoria = checar_titulo(id_titulo)
+    rows, proximo = paginar(await _agregado(db, [id_titulo], granularidade, inicio, data_fim, limite=limite_linhas(limite, [id_titulo])), limite)
+    payload = payload_historico(id_titulo, categoria, granularidade, rows)
+    return cached_response(request, cache.put(chave, [id_titulo], payload, headers_pagina(proximo)), "MISS")
+
+# 5b) GET - indicadores derivados da série de um título (fluxo líquido, posição, 12 meses, variação anual, participação)
+@router.get("/titulo_tesouro/{id_titulo}/indicadores")
+async def indicadores_titulo(
+    request: Request,
+    id_titulo: int,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    granularity: Optional[str] = Query(None, pattern="^(mes|trimestre|semestre|ano)$"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    granularidade = granularity or "mes"
+    verificar_recarga()
+    chave = ("indicadores", id_titulo, data_inicio, data_fim, granularidade)
+    item = cache.get(chave)
+    if item:
+        return cached_response(request, item, "HIT")
+
+    categoria = checar_titulo(id_titulo)
+    rows = await _indicadores(db, id_titulo, granularidade, data_inicio, data_fim)
+    payload = payload_indicadores(id_titulo, categoria, granularidade, rows)
+    # a participação depende do total de todos os títulos: qualquer escrita invalida
+    return cached_response(request, cache.put(chave, registry.por_id.keys(), payload), "MISS")
+
+# 6) GET - vendas por período
+@router.get("/titulos_tesouro/venda/{id_titulo}")
+async def vendas_por_periodo(id_titulo: int, data_inicio: Optional[date]=None, data_fim: Optional[date]=None, group_by: Optional[str]=Query(None, pattern="^(ano)$"), db: AsyncSession=Depends(get_async_read_db)):
+    checar_titulo(id_titulo)
+    ler = _anual if group_by == "ano" else _mensal
+    return ORJSONResponse(payload_serie(await ler(db, [id_titulo], data_inicio, data_fim, acao="venda"), "venda", group_by))
+
+# 7) GET - resgates por período
+@router.get("/titulos_tesouro/resgate/{id_titulo}")
+async def resgates_por_periodo(id_titulo: int, data_inicio: Optional[date]=None, data_fim: Optional[date]=None, group_by: Optional[str]=Query(None, pattern="^(ano)$"), db: AsyncSession=Depends(get_async_read_db)):
+    checar_titulo(id_titulo)
+    ler = _anual if group_by == "ano" else _mensal
+    return ORJSONResponse(payload_serie(await ler(db, [id_titulo], data_inicio, data_fim, acao="resgate"), "resgate", group_by))
@@ -0,0 +1,337 @@
+import os
+from functools import lru_cache
+from typing import List, Optional
+from datetime import date
+import orjson
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from sqlalchemy import select, update, bindparam
+from .database import ETL_VERSAO_PATH, insert_stmt, sql_fixo
+from .models import Movimento, para_centavos
+from .rollups import stmts_delta_lote
+from .cache import ResponseCache, CacheEntry
+from .registry import TituloRegistry
+from .formats import MIME, ENCODERS, colunas, stream, astream
+from .schemas import (
+    ValorTitulo, ComparacaoMes, ComparacaoAno, PontoAno, PONTO_POR_GRANULARIDADE, Historico, SERIE,
+    INDICADOR_POR_GRANULARIDADE, Indicadores,
+)
+
+# estado compartilhado pelos endpoints sync (api.py) e async (api_async.py)
+
+# títulos em memória: nenhum endpoint consulta a tabela `titulos` por requisição
+registry = TituloRegistry()
+
+# motor de leitura: "sql" (resumos no banco), "columnar" (cópia NumPy em memória),
+# "snapshot" (Arrow IPC mapeado em memória, compartilhado entre workers)
+# ou "duckdb" (DuckDB embutido sobre o dataset Parquet ou o data.db anexado)
+READ_ENGINE = os.environ.get("TESOURO_READ_ENGINE", "sql")
+if READ_ENGINE == "columnar":
+    from .columnar import ColumnarStore
+    store = ColumnarStore()
+elif READ_ENGINE == "duckdb":
+    from .duckdb_store import DuckDBStore
+    store = DuckDBStore()
+elif READ_ENGINE == "snapshot":
+    from .snapshot import SnapshotStore
+    store = SnapshotStore()
+else:
+    store = None
+
+# cache das respostas serializadas de histórico/comparação (TESOURO_CACHE_MAX=0 desliga)
+cache = ResponseCache(
+    maxsize=int(os.environ.get("TESOURO_CACHE_MAX", "1024")),
+    ttl=float(os.environ.get("TESOURO_CACHE_TTL", "300")),
+    marker_path=ETL_VERSAO_PATH,
+)
+
+# linhas por lote ao ler do cursor do banco nos formatos em streaming
+LOTE_STREAM = int(os.environ.get("TESOURO_STREAM_LOTE", "1000"))
+
+class MovimentoCreate(BaseModel):
+    categoria_titulo: str = Field(..., examples=["NTN-B"])
+    mes: int
+    ano: int
+    acao: str = Field(..., pattern="^(venda|resgate)$")
+    valor: float = Field(..., ge=0)
+
+class MovimentoUpdate(BaseModel):
+    mes: Optional[int] = None
+    ano: Optional[int] = None
+    acao: Optional[str] = Field(None, pattern="^(venda|resgate)$")
+    valor: float = Field(..., ge=0)
+
+# POST /titulo_tesouro/batch: limite de itens por requisição
+LOTE_MAX = int(os.environ.get("TESOURO_LOTE_MAX", "50000"))
+_lote_adapter = TypeAdapter(List[MovimentoCreate])
+
+LOTE_OPENAPI = {"requestBody": {"required": True, "content": {
+    mime: {"schema": {"type": "array", "items": {"$ref": "#/components/schemas/MovimentoCreate"}}}
+    for mime in ("application/json", "application/x-ndjson")
+}}}
+
+def first_day(ano:int, mes:int) -> date:
+    return date(ano, mes, 1)
+
+def titulo_id_by_categoria(categoria: str) -> int:
+    titulo_id = registry.titulo_id(categoria)
+    if titulo_id is None:
+        raise HTTPException(status_code=400, detail=f"categoria_titulo inválida: {categoria}")
+    return titulo_id
+
+def parse_ids(ids: str) -> list:
+    ids_list = [int(x) for x in ids.split(",") if x.strip().isdigit()]
+    if not ids_list or len(ids_list) < 2:
+        raise HTTPException(400, "forneça ao menos dois ids")
+    return ids_list
+
+def checar_titulo(titulo_id: int) -> str:
+    categoria = registry.categoria(titulo_id)
+    if categoria is None:
+        raise HTTPException(404, "titulo não encontrado")
+    return categoria
+
+def invalidar(*titulo_ids: int):
+    if store:
+        store.invalidar()
+    cache.invalidar_titulos(titulo_ids)
+
+def verificar_recarga():
+    # nova carga do pipeline: descarta cache e store e relê os títulos
+    if cache.recarga_detectada():
+        registry.carregar()
+        if store:
+            store.recarregar()
+
+def cached_response(request: Request, item: CacheEntry, status: str) -> Response:
+    # o corpo depende do Accept (formatos negociados), não só da URL
+    headers = {**item.headers, "ETag": item.etag, "X-Cache": status, "Vary": "Accept"}
+    if request.headers.get("if-none-match") == item.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=item.body, media_type="application/json", headers=headers)
+
+# escrita em lote: validação, upsert aditivo em bloco e resultado por item
+
+async def corpo_lote(request: Request) -> list:
+    """corpo do POST /batch: array JSON ou NDJSON (um movimento por linha)"""
+    corpo = await request.body()
+    ndjson = request.headers.get("content-type", "").startswith("application/x-ndjson")
+    try:
+        itens = [orjson.loads(linha) for linha in corpo.splitlines() if linha.strip()] if ndjson else orjson.loads(corpo)
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(400, f"corpo inválido: {e}")
+    if not isinstance(itens, list):
+        raise HTTPException(400, "esperado um array JSON ou NDJSON")
+    if len(itens) > LOTE_MAX:
+        raise HTTPException(413, f"lote acima de {LOTE_MAX} itens")
+    return itens
+
+def _erro_item(resultados: list, i: int, msg: str):
+    if resultados[i] is None:
+        resultados[i] = {"indice": i, "status": "erro", "erros": []}
+    resultados[i]["erros"].append(msg)
+
+def validar_lote(itens: list) -> tuple:
+    """valida o lote inteiro numa passada do pydantic-core (MovimentoCreate) e soma os válidos por chave
+
+    Devolve (resultados, chaves, somas): resultados[i] já preenchido para os itens com erro,
+    chaves[i] = (titulo_id, periodo, acao) dos válidos e somas[chave] = total no lote, em centavos.
+    """
+    resultados = [None] * len(itens)
+    try:
+        movs = list(enumerate(_lote_adapter.validate_python(itens)))
+    except ValidationError as e:
+        for err in e.errors(include_url=False):
+            campo = ".".join(map(str, err["loc"][1:]))
+            _erro_item(resultados, err["loc"][0], f"{campo}: {err['msg']}" if campo else err["msg"])
+        validos = [i for i, r in enumerate(resultados) if r is None]
+        movs = list(zip(validos, _lote_adapter.validate_python([itens[i] for i in validos])))
+    chaves, somas = {}, {}
+    for i, mov in movs:
+        titulo_id = registry.titulo_id(mov.categoria_titulo)
+        if titulo_id is None:
+            _erro_item(resultados, i, f"categoria_titulo inválida: {mov.categoria_titulo}")
+        if not 1 <= mov.mes <= 12:
+            _erro_item(resultados, i, "mes deve ser 1..12")
+        if not 1 <= mov.ano <= 9999:
+            _erro_item(resultados, i, "ano inválido")
+        if resultados[i] is not None:
+            continue
+        chave = (titulo_id, first_day(mov.ano, mov.mes), mov.acao)
+        chaves[i] = chave
+        somas[chave] = somas.get(chave, 0) + para_centavos(mov.valor)
+    return resultados, chaves, somas
+
+def stmt_existentes(somas: dict):
+    """(titulo_id, periodo, acao) já gravados entre as chaves do lote (filtro grosso; o exato é feito em Python)"""
+    M = Movimento
+    return select(M.titulo_id, M.periodo, M.acao).where(
+        M.titulo_id.in_({t for t, _, _ in somas}), M.periodo.in_({p for _, p, _ in somas}))
+
+def stmt_upsert_lote():
+    """INSERT ... ON CONFLICT DO UPDATE somando ao valor existente, RETURNING id, chave e valor final
+
+    A soma acontece dentro do statement: escritas concorrentes na mesma chave não se perdem.
+    """
+    M = Movimento.__table__
+    stmt = insert_stmt(M)
+    return stmt.on_conflict_do_update(
+        index_elements=["titulo_id", "periodo", "acao"],
+        set_={"valor_centavos": M.c.valor_centavos + stmt.excluded.valor_centavos},
+    ).returning(M.c.id, M.c.titulo_id, M.c.periodo, M.c.acao, M.c.valor_centavos)
+
+_COLS_MOVIMENTO = ("titulo_id", "periodo", "ano", "mes", "acao", "valor_centavos")
+
+@lru_cache(maxsize=None)
+def stmt_inserir_movimento():
+    """INSERT ... ON CONFLICT DO NOTHING RETURNING id, já compilado: sem linha de volta, a chave já existia"""
+    M = Movimento.__table__
+    stmt = insert_stmt(M).values({c: bindparam(c) for c in _COLS_MOVIMENTO})
+    return sql_fixo(stmt.on_conflict_do_nothing(index_elements=["titulo_id", "periodo", "acao"]).returning(M.c.id))
+
+@lru_cache(maxsize=None)
+def stmt_somar_movimento():
+    """UPDATE aditivo RETURNING id na chave existente (a soma é feita pelo banco, sem ler-modificar-gravar)"""
+    M = Movimento.__table__
+    return sql_fixo(
+        update(M)
+        .where(M.c.titulo_id == bindparam("titulo_id"), M.c.periodo == bindparam("periodo"), M.c.acao == bindparam("acao"))
+        .values(valor_centavos=M.c.valor_centavos + bindparam("valor_centavos"))
+        .returning(M.c.id)
+    )
+
+def params_upsert_lote(somas: dict) -> list:
+    return [{"titulo_id": t, "periodo": p, "ano": p.year, "mes": p.month, "acao": a, "valor_centavos": v}
+            for (t, p, a), v in somas.items()]
+
+def deltas_lote(somas: dict, existentes: set) -> list:
+    # chave nova conta um movimento a mais no resumo; a existente só soma valor
+    return stmts_delta_lote((t, p, a, v, int((t, p, a) not in existentes)) for (t, p, a), v in somas.items())
+
+def resumo_lote(resultados: list, chaves: dict, existentes: set, ids: dict) -> dict:
+    for i, chave in chaves.items():
+        resultados[i] = {"indice": i, "status": "ok", "item_id": ids[chave],
+                         "resultado": "somado" if chave in existentes else "criado"}
+    return {
+        "criados": len(set(chaves.values()) - existentes),
+        "somados": len(set(chaves.values()) & existentes),
+        "erros": len(resultados) - len(chaves),
+        "itens": resultados,
+    }
+
+# paginação por cursor em `periodo`: o cursor é o último mês recebido, `limite` conta meses
+
+def checar_paginacao(granularidade: str, formato: str, cursor: Optional[date], limite: Optional[int]):
+    if (cursor or limite) and granularidade != "mes":
+        raise HTTPException(400, "paginação por cursor só na granularidade mensal")
+    if limite and formato != "json":
+        raise HTTPException(400, "limite só se aplica ao formato json; os demais são enviados em streaming")
+
+def inicio_apos(data_inicio: Optional[date], cursor: Optional[date]) -> Optional[date]:
+    """primeiro dia do mês seguinte ao cursor (ou data_inicio, se posterior)"""
+    if cursor is None:
+        return data_inicio
+    prox = date(cursor.year + cursor.month // 12, cursor.month % 12 + 1, 1)
+    return max(data_inicio, prox) if data_inicio else prox
+
+def limite_linhas(limite: Optional[int], titulo_ids: list) -> Optional[int]:
+    # cada mês tem no máximo uma linha por título; +1 mês para saber se há próxima página
+    return (limite + 1) * len(set(titulo_ids)) if limite else None
+
+def paginar(rows, limite: Optional[int]) -> tuple:
+    """corta as linhas (ordenadas por período) em `limite` meses; devolve (linhas, próximo cursor)"""
+    if not limite:
+        return rows, None
+    vistos, anterior = 0, None
+    for i, r in enumerate(rows):
+        mes = (r[1], r[2])
+        if mes != anterior:
+            if vistos == limite:
+                return rows[:i], first_day(*anterior)
+            vistos, anterior = vistos + 1, mes
+    return rows, None
+
+def headers_pagina(proximo: Optional[date]) -> Optional[dict]:
+    return {"X-Next-Cursor": proximo.isoformat()} if proximo else None
+
+# formatos em streaming (ndjson/csv/arrow/parquet): lotes do cursor do banco -> linhas planas
+
+def _linhas_planas(rows, granularidade: str) -> list:
+    categorias = registry.por_id
+    if granularidade == "ano":
+        return [(t, categorias.get(t, ""), ano, vv or 0.0, vr or 0.0) for t, ano, _, vv, vr in rows]
+    return [(t, categorias.get(t, ""), ano, sub, vv or 0.0, vr or 0.0) for t, ano, sub, vv, vr in rows]
+
+def resposta_tabular(formato: str, granularidade: str, lotes) -> StreamingResponse:
+    """`lotes` é um iterável (ou async iterável) de listas de (titulo_id, ano, sub, venda, resgate)"""
+    encoder = ENCODERS[formato](colunas(granularidade))
+    if hasattr(lotes, "__aiter__"):
+        async def planos():
+            async for rows in lotes:
+                yield _linhas_planas(rows, granularidade)
+        corpo = astream(encoder, planos())
+    else:
+        corpo = stream(encoder, (_linhas_planas(rows, granularidade) for rows in lotes))
+    return StreamingResponse(corpo, media_type=MIME[formato], headers={"Vary": "Accept"})
+
+def aplicar_update(obj: Movimento, mov: MovimentoUpdate):
+    if mov.valor is not None:
+        obj.valor_centavos = para_centavos(mov.valor)
+    if mov.acao is not None:
+        if mov.acao not in ("venda","resgate"):
+            raise HTTPException(400, "acao inválida")
+        obj.acao = mov.acao
+    if mov.ano is not None:
+        obj.ano = int(mov.ano)
+        obj.periodo = date(obj.ano, obj.mes, 1)
+    if mov.mes is not None:
+        if mov.mes < 1 or mov.mes > 12:
+            raise HTTPException(400, "mes deve ser 1..12")
+        obj.mes = int(mov.mes)
+        obj.periodo = date(obj.ano, obj.mes, 1)
+
+def filtro_duplicado(id: int, obj: Movimento) -> tuple:
+    # unicidade (titulo,periodo,acao)
+    return (
+        Movimento.id != id,
+        Movimento.titulo_id == obj.titulo_id,
+        Movimento.periodo == obj.periodo,
+        Movimento.acao == obj.acao,
+    )
+
+# montagem dos payloads (esquemas de schemas.py) a partir das linhas (titulo_id, ano, ..., venda, resgate)
+
+def payload_comparar(rows, group_by: Optional[str]) -> list:
+    categorias = registry.por_id
+    if group_by == "ano":
+        by_year = {}
+        for titulo_id, ano, vv, vr in rows:
+            by_year.setdefault(ano, []).append(ValorTitulo(titulo_id, categorias.get(titulo_id, ""), vv or 0.0, vr or 0.0))
+        return [ComparacaoAno(ano, arr) for ano, arr in by_year.items()]
+    by_month = {}
+    for titulo_id, ano, mes, vv, vr in rows:
+        by_month.setdefault((ano, mes), []).append(ValorTitulo(titulo_id, categorias.get(titulo_id, ""), vv, vr))
+    return [ComparacaoMes(ano, mes, arr) for (ano, mes), arr in by_month.items()]
+
+def payload_historico(id_titulo: int, categoria: str, granularidade: str, rows) -> Historico:
+    if granularidade == "ano":
+        historico = [PontoAno(ano, vv or 0.0, vr or 0.0) for _, ano, _, vv, vr in rows]
+    else:
+        ponto = PONTO_POR_GRANULARIDADE[granularidade]
+        historico = [ponto(ano, sub, vv or 0.0, vr or 0.0) for _, ano, sub, vv, vr in rows]
+    return Historico(id_titulo, categoria, historico)
+
+def payload_serie(rows, acao: str, group_by: Optional[str]) -> list:
+    esquema = SERIE[(acao, group_by)]
+    pos = -2 if acao == "venda" else -1
+    if group_by == "ano":
+        return [esquema(r[1], r[pos] or 0.0) for r in rows]
+    return [esquema(r[1], r[2], r[pos]) for r in rows]
+
+def payload_indicadores(id_titulo: int, categoria: str, granularidade: str, rows) -> Indicadores:
+    """linhas de rollups.ler_indicadores (ano, sub, ...)"""
+    esquema = INDICADOR_POR_GRANULARIDADE[granularidade]
+    if granularidade == "ano":
+        return Indicadores(id_titulo, categoria, granularidade, [esquema(r[0], *r[2:]) for r in rows])
+    return Indicadores(id_titulo, categoria, granularidade, [esquema(*r) for r in rows])
@@ -0,0 +1,122 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Hashable, Iterable, Optional
+from .schemas import dumps
+
+class CacheEntry:
+    __slots__ = ("body", "etag", "titulos", "expira", "headers")
+
+    def __init__(self, body: bytes, etag: str, titulos: frozenset, expira: float, headers: Optional[dict] = None):
+        self.body = body
+        self.etag = etag
+        self.titulos = titulos
+        self.expira = expira
+        self.headers = headers or {}
+
+class ResponseCache:
+    """LRU + TTL de respostas já serializadas, indexado pelos títulos que cada uma cobre
+
+    `marker_path` é um arquivo que o pipeline reescreve a cada carga: se o seu
+    mtime muda, o cache inteiro é descartado na próxima consulta.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, marker_path: Optional[str] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.marker_path = marker_path
+        self._lock = threading.Lock()
+        self._itens = OrderedDict()
+        self._por_titulo = {}
+        self._marker = self._marker_mtime()
+        self.hits = 0
+        self.misses = 0
+        self.invalidacoes = 0
+
+    def _marker_mtime(self):
+        if not self.marker_path:
+            return None
+        try:
+            return os.stat(self.marker_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def recarga_detectada(self) -> bool:
+        """True (e cache limpo) se o pipeline publicou uma nova carga desde a última checagem"""
+        atual = self._marker_mtime()
+        if atual == self._marker:
+            return False
+        with self._lock:
+            self._marker = atual
+            self._limpar()
+        return True
+
+    def get(self, chave: Hashable) -> Optional[CacheEntry]:
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None or item.expira < time.monotonic():
+                if item is not None:
+                    self._remover(chave)
+                self.misses += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.hits += 1
+            return item
+
+    def put(self, chave: Hashable, titulos: Iterable[int], payload, headers: Optional[dict] = None) -> CacheEntry:
+        body = dumps(payload)
+        item = CacheEntry(body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+                          frozenset(titulos), time.monotonic() + self.ttl, headers)
+        if self.maxsize <= 0:
+            return item
+        with self._lock:
+            if chave in self._itens:
+                self._remover(chave)
+            self._itens[chave] = item
+            for t in item.titulos:
+                self._por_titulo.setdefault(t, set()).add(chave)
+            while len(self._itens) > self.maxsize:
+                self._remover(next(iter(self._itens)))
+        return item
+
+    def invalidar_titulos(self, titulos: Iterable[int]):
+        with self._lock:
+            for t in titulos:
+                for chave in list(self._por_titulo.get(t, ())):
+                    self._remover(chave)
+                    self.invalidacoes += 1
+
+    def limpar(self):
+        with self._lock:
+            self._limpar()
+
+    def _limpar(self):
+        self.invalidacoes += len(self._itens)
+        self._itens.clear()
+        self._por_titulo.clear()
+
+    def _remover(self, chave: Hashable):
+        item = self._itens.pop(chave, None)
+        if item is None:
+            return
+        for t in item.titulos:
+            chaves = self._por_titulo.get(t)
+            if chaves:
+                chaves.discard(chave)
+                if not chaves:
+                    del self._por_titulo[t]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "itens": len(self._itens),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "invalidacoes": self.invalidacoes,
+            }
@@ -0,0 +1,166 @@
+import threading
+from datetime import date
+from typing import Optional
+import numpy as np
+from sqlalchemy import select
+from .database import ReadSessionLocal
+from .models import ResumoMensal
+from .rollups import PERIODOS_POR_ANO
+
+def _mes_idx(d: date, inclusivo_inicio: bool) -> int:
+    # periodo é sempre o dia 1: `periodo >= d` só inclui o mês de d se d for dia 1
+    idx = d.year * 12 + d.month - 1
+    return idx + 1 if inclusivo_inicio and d.day > 1 else idx
+
+class _Snapshot:
+    __slots__ = ("titulo_id", "mes_idx", "ano", "mes", "venda", "resgate", "n_venda", "n_resgate", "inicio")
+
+class ColumnarStore:
+    """cópia em memória do resumo mensal em colunas NumPy, ordenada por (titulo_id, periodo)
+
+    Cada título ocupa um bloco contíguo; intervalos de datas viram busca binária
+    no bloco e as somas anuais são feitas com bincount. Escritas chamam
+    `invalidar()`, que incrementa a versão; a próxima leitura recarrega.
+    """
+
+    def __init__(self, session_factory=ReadSessionLocal):
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        self._snap = None
+        self._versao_carregada = -1
+        self.versao = 0
+
+    def invalidar(self):
+        with self._lock:
+            self.versao += 1
+
+    def recarregar(self):
+        # nova carga do pipeline
+        self.invalidar()
+
+    def _carregar(self) -> _Snapshot:
+        R = ResumoMensal
+        with self._session_factory() as db:
+            rows = db.execute(select(
+                R.titulo_id, R.ano, R.mes, R.venda_centavos, R.resgate_centavos, R.n_venda, R.n_resgate,
+            ).order_by(R.titulo_id, R.periodo)).all()
+        cols = list(zip(*rows)) if rows else [()] * 7
+        s = _Snapshot()
+        s.titulo_id = np.array(cols[0], dtype=np.int32)
+        s.ano = np.array(cols[1], dtype=np.int32)
+        s.mes = np.array(cols[2], dtype=np.int32)
+        s.mes_idx = s.ano * 12 + s.mes - 1
+        # centavos inteiros: somas exatas (em float64 até 2**53); reais só na saída
+        s.venda = np.array(cols[3], dtype=np.int64)
+        s.resgate = np.array(cols[4], dtype=np.int64)
+        s.n_venda = np.array(cols[5], dtype=np.int32)
+        s.n_resgate = np.array(cols[6], dtype=np.int32)
+        # início do bloco de cada título (titulo_id já vem ordenado)
+        ids, inicio = np.unique(s.titulo_id, return_index=True)
+        fim = np.append(inicio[1:], len(s.titulo_id))
+        s.inicio = {int(t): (int(a), int(b)) for t, a, b in zip(ids, inicio, fim)}
+        return s
+
+    def snapshot(self) -> _Snapshot:
+        with self._lock:
+            if self._versao_carregada != self.versao or self._snap is None:
+                versao = self.versao
+                self._snap = self._carregar()
+                self._versao_carregada = versao
+            return self._snap
+
+    def _fatia(self, s: _Snapshot, titulo_id: int, data_inicio, data_fim) -> slice:
+        a, b = s.inicio.get(titulo_id, (0, 0))
+        if data_inicio:
+            a += int(np.searchsorted(s.mes_idx[a:b], _mes_idx(data_inicio, True), side="left"))
+        if data_fim:
+            b = a + int(np.searchsorted(s.mes_idx[a:b], _mes_idx(data_fim, False), side="right"))
+        return slice(a, b)
+
+    def _indices(self, s: _Snapshot, titulo_ids: list, data_inicio, data_fim, acao) -> np.ndarray:
+        partes = [np.arange(f.start, f.stop) for f in (self._fatia(s, t, data_inicio, data_fim) for t in dict.fromkeys(titulo_ids))]
+        idx = np.concatenate(partes) if partes else np.empty(0, dtype=np.int64)
+        if acao == "venda":
+            idx = idx[s.n_venda[idx] > 0]
+        elif acao == "resgate":
+            idx = idx[s.n_resgate[idx] > 0]
+        return idx
+
+    def mensal(self, titulo_ids: list, data_inicio: Optional[date] = None, data_fim: Optional[date] = None, acao: Optional[str] = None, limite: Optional[int] = None):
+        """mesmo contrato de rollups.ler_mensal"""
+        s = self.snapshot()
+        idx = self._indices(s, titulo_ids, data_inicio, data_fim, acao)
+        idx = idx[np.lexsort((s.titulo_id[idx], s.mes_idx[idx]))][:limite]
+        return list(zip(s.titulo_id[idx].tolist(), s.ano[idx].tolist(), s.mes[idx].tolist(),
+                        (s.venda[idx] / 100).tolist(), (s.resgate[idx] / 100).tolist()))
+
+    def anual(self, titulo_ids: list, data_inicio: Optional[date] = None, data_fim: Optional[date] = None, acao: Optional[str] = None):
+        """mesmo contrato de rollups.ler_anual"""
+        return [(t, a, vv, vr) for t, a, _, vv, vr in self._agrupar(titulo_ids, 1, data_inicio, data_fim, acao)]
+
+    def agregado(self, titulo_ids: list, granularidade: str, data_inicio: Optional[date] = None, data_fim: Optional[date] = None, acao: Optional[str] = None, limite: Optional[int] = None):
+        """mesmo contrato de rollups.ler_agregado"""
+        if granularidade == "mes":
+            return self.mensal(titulo_ids, data_inicio, data_fim, acao, limite)
+        return self._agrupar(titulo_ids, PERIODOS_POR_ANO[granularidade], data_inicio, data_fim, acao)
+
+    def _agrupar(self, titulo_ids: list, por_ano: int, data_inicio, data_fim, acao):
+        s = self.snapshot()
+        idx = self._indices(s, titulo_ids, data_inicio, data_fim, acao)
+        if not len(idx):
+            return []
+        # chave (período, título) densa -> somas vetorizadas com bincount
+        bucket = s.ano[idx] * por_ano + (s.mes[idx] - 1) * por_ano // 12
+        b0 = int(bucket.min())
+        tids, tpos = np.unique(s.titulo_id[idx], return_inverse=True)
+        chave = (bucket - b0) * len(tids) + tpos
+        venda = np.bincount(chave, weights=s.venda[idx])
+        resgate = np.bincount(chave, weights=s.resgate[idx])
+        presentes = np.flatnonzero(np.bincount(chave))
+        buckets = presentes // len(tids) + b0
+        return list(zip(tids[presentes % len(tids)].tolist(), (buckets // por_ano).tolist(), (buckets % por_ano + 1).tolist(),
+                        (venda[presentes] / 100).tolist(), (resgate[presentes] / 100).tolist()))
+
+    def indicadores(self, titulo_id: int, granularidade: str = "mes", data_inicio: Optional[date] = None, data_fim: Optional[date] = None):
+        """mesmo contrato de rollups.ler_indicadores"""
+        s = self.snapshot()
+        por_ano = PERIODOS_POR_ANO[granularidade]
+        f = self._fatia(s, titulo_id, None, data_fim)
+        if f.start == f.stop:
+            return []
+        # bloco do título já ordenado por período: somas por bucket com reduceat (inteiros, exatas)
+        bt = s.ano[f] * por_ano + (s.mes[f] - 1) * por_ano // 12
+        inicio = np.flatnonzero(np.r_[True, bt[1:] != bt[:-1]])
+        buckets = bt[inicio]
+        ultimo = s.mes_idx[f][np.r_[inicio[1:], len(bt)] - 1]
+        venda = np.add.reduceat(s.venda[f], inicio)
+        resgate = np.add.reduceat(s.resgate[f], inicio)
+        fluxo = venda - resgate
+        # janelas por RANGE no índice do bucket, via somas acumuladas e busca binária
+        j = np.searchsorted(buckets, buckets - (por_ano - 1), side="left")
+        acum_v, acum_r = np.r_[0, np.cumsum(venda)], np.r_[0, np.cumsum(resgate)]
+        pos = np.arange(1, len(buckets) + 1)
+        venda_12m, resgate_12m = acum_v[pos] - acum_v[j], acum_r[pos] - acum_r[j]
+        k = np.minimum(np.searchsorted(buckets, buckets - por_ano), len(buckets) - 1)
+        existe = buckets[k] == buckets - por_ano
+        venda_aa, resgate_aa = np.where(existe, venda[k], 0), np.where(existe, resgate[k], 0)
+        # total de todos os títulos em cada bucket da série
+        todos = s.mes_idx <= _mes_idx(data_fim, False) if data_fim else slice(None)
+        ba = s.ano[todos] * por_ano + (s.mes[todos] - 1) * por_ano // 12
+        dentro = (ba >= buckets[0]) & (ba <= buckets[-1])
+        n = int(buckets[-1] - buckets[0]) + 1
+        total_v = np.bincount(ba[dentro] - buckets[0], weights=s.venda[todos][dentro], minlength=n)[buckets - buckets[0]]
+        total_r = np.bincount(ba[dentro] - buckets[0], weights=s.resgate[todos][dentro], minlength=n)[buckets - buckets[0]]
+        sel = ultimo >= _mes_idx(data_inicio, True) if data_inicio else slice(None)
+        colunas = [
+            buckets // por_ano, buckets % por_ano + 1,
+            venda / 100, resgate / 100, fluxo / 100, np.cumsum(fluxo) / 100,
+            venda_12m / 100, resgate_12m / 100, (venda_12m - resgate_12m) / 100,
+            _razao(venda, venda_aa) - 1, _razao(resgate, resgate_aa) - 1, _razao(venda, total_v), _razao(resgate, total_r),
+        ]
+        return list(zip(*([None if x != x else x for x in c[sel].tolist()] for c in colunas)))
+
+def _razao(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # NaN (-> None na saída) quando o denominador é zero, como o NULLIF do SQL
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(b != 0, a / np.where(b != 0, b, 1), np.nan)
@@ -1,10 +1,81 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import os
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker, declarative_base, Mapper
+from . import metricas
 
-DB_PATH = "dados/data.db"
-engine = create_engine(f"sqlite:///{DB_PATH}", connect_args={"check_same_thread": False})
+DADOS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dados")
+DB_PATH = os.path.join(DADOS_DIR, "data.db")
+# reescrito pelo pipeline a cada carga; leitores comparam o mtime para descartar caches
+ETL_VERSAO_PATH = os.path.join(DADOS_DIR, ".etl_versao")
+
+# TESOURO_DB_URL aponta para outro banco (ex: postgresql://...); TESOURO_DB_READ_URL para
+# uma réplica/cópia só de leitura usada pelos GETs (padrão: o mesmo banco, em conexões query_only)
+DB_URL = os.environ.get("TESOURO_DB_URL", f"sqlite:///{DB_PATH}")
+DB_READ_URL = os.environ.get("TESOURO_DB_READ_URL", DB_URL)
+
+POOL_SIZE = int(os.environ.get("TESOURO_DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.environ.get("TESOURO_DB_MAX_OVERFLOW", "20"))
+SQLITE_MMAP_SIZE = int(os.environ.get("TESOURO_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_KB = int(os.environ.get("TESOURO_SQLITE_CACHE_KB", str(64 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("TESOURO_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+def _sqlite_pragmas(somente_leitura: bool):
+    def on_connect(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        if not somente_leitura:
+            # transações controladas por _begin_immediate (o BEGIN implícito do sqlite3 é DEFERRED)
+            dbapi_conn.isolation_level = None
+            # WAL: leitores não bloqueiam (nem são bloqueados) pelo writer do ETL
+            cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute("PRAGMA synchronous=NORMAL")
+        else:
+            cur.execute("PRAGMA query_only=ON")
+        cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cur.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.close()
+    return on_connect
+
+def _begin_immediate(conn):
+    # pega o lock de escrita já no início: uma transação DEFERRED que leu e depois tenta escrever
+    # recebe SQLITE_BUSY na hora (sem esperar o busy_timeout) quando há outro writer
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+def make_engine(url: str, somente_leitura: bool = False, async_: bool = False):
+    """engine com pool ajustado e, no SQLite, pragmas aplicados em cada conexão nova"""
+    sqlite = url.startswith("sqlite")
+    # :memory: usa pool de conexão única; os demais, QueuePool dimensionado para leitores concorrentes
+    kwargs = {} if ":memory:" in url else {"pool_size": POOL_SIZE, "max_overflow": MAX_OVERFLOW, "pool_pre_ping": not sqlite}
+    if sqlite and not async_:
+        kwargs["connect_args"] = {"check_same_thread": False}
+    if async_:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        if sqlite and kwargs:
+            # aiosqlite usaria NullPool (uma conexão/thread nova por sessão)
+            from sqlalchemy.pool import AsyncAdaptedQueuePool
+            kwargs["poolclass"] = AsyncAdaptedQueuePool
+        eng = create_async_engine(async_url(url), **kwargs)
+        sync_engine = eng.sync_engine
+    else:
+        eng = sync_engine = create_engine(url, **kwargs)
+    # consultas e tempo de SQL por requisição da API; log de consultas lentas (ver metricas.py)
+    event.listen(sync_engine, "before_cursor_execute", metricas.sql_inicio)
+    event.listen(sync_engine, "after_cursor_execute", metricas.sql_fim)
+    event.listen(sync_engine, "handle_error", metricas.sql_erro)
+    if sqlite:
+        event.listen(sync_engine, "connect", _sqlite_pragmas(somente_leitura))
+        if not somente_leitura:
+            event.listen(sync_engine, "begin", _begin_immediate)
+    return eng
+
+engine = make_engine(DB_URL)
+read_engine = make_engine(DB_READ_URL, somente_leitura=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 Base = declarative_base()
+# instâncias ORM carregadas, em todos os mappers
+event.listen(Mapper, "load", metricas.orm_carregada)
 
 def get_db():
     db = SessionLocal()
@@ -12,3 +83,55 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# modo async da API: mesmo banco via driver assíncrono (criado só quando usado)
+_ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+_async_sessionmakers = {}
+
+def async_url(url: str) -> str:
+    esquema, resto = url.split("://", 1)
+    return f"{_ASYNC_DRIVERS.get(esquema.split('+')[0], esquema)}://{resto}"
+
+def get_async_sessionmaker(somente_leitura: bool = False):
+    if somente_leitura not in _async_sessionmakers:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        url = DB_READ_URL if somente_leitura else DB_URL
+        async_engine = make_engine(url, somente_leitura=somente_leitura, async_=True)
+        _async_sessionmakers[somente_leitura] = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return _async_sessionmakers[somente_leitura]
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+async def get_async_read_db():
+    async with get_async_sessionmaker(somente_leitura=True)() as db:
+        yield db
+
+def insert_stmt(table):
+    # INSERT ... ON CONFLICT existe no SQLite e no Postgres com a mesma API
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+def sql_fixo(stmt):
+    """`stmt` compilado uma vez e devolvido como text() com parâmetros nomeados
+
+    Para statements que o SQLAlchemy não guarda no cache de compilação (o INSERT ... ON CONFLICT
+    do SQLite não tem cache key) e seriam recompilados a cada execução.
+    """
+    compilado = stmt.compile(dialect=type(engine.dialect)(paramstyle="named"))
+    # literais viram parâmetros com valor embutido no compilado, que o text() perderia
+    fixos = [k for k, v in compilado.params.items() if v is not None]
+    if fixos:
+        raise ValueError(f"sql_fixo: use bindparam()/literal_column() em vez dos literais {fixos}")
+    return text(str(compilado))
@@ -0,0 +1,143 @@
+"""dataset Parquet particionado (Hive) dos movimentos: dados/titulos_tesouro/categoria_titulo=<cat>/ano=<ano>/
+
+Cada partição é um único arquivo zstd, ordenado por período, com dicionário e estatísticas por
+row group. A carga completa monta o dataset num diretório temporário e troca por rename; a
+incremental reescreve só as partições tocadas (arquivo temporário + os.replace), então um leitor
+vê sempre a versão anterior ou a nova de cada partição. As leituras usam pyarrow.dataset com
+poda de partições (categoria/ano) e filtros empurrados para as estatísticas (periodo, acao).
+"""
+import os
+import shutil
+from datetime import date
+from typing import Optional
+from urllib.parse import quote
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from .utils import TITULOS_ID_MAP, centavos
+
+DATASET_PATH = os.environ.get("TESOURO_DATASET_PATH") or os.path.join(os.path.dirname(os.path.dirname(__file__)), "dados", "titulos_tesouro")
+ARQUIVO = "part-0.parquet"
+ROW_GROUP = int(os.environ.get("TESOURO_PARQUET_ROW_GROUP", "65536"))
+
+# colunas gravadas nos arquivos; categoria_titulo e ano vêm do caminho da partição
+ESQUEMA = pa.schema([
+    ("titulo_id", pa.int16()),
+    ("periodo", pa.date32()),
+    ("mes", pa.int8()),
+    ("acao", pa.dictionary(pa.int8(), pa.string())),
+    ("valor_centavos", pa.int64()),
+])
+PARTICOES = pa.schema([("categoria_titulo", pa.string()), ("ano", pa.int16())])
+
+_CATEGORIA_POR_ID = {id_: nome for nome, id_ in TITULOS_ID_MAP.items()}
+
+def _tabela(df: pd.DataFrame) -> pa.Table:
+    return pa.table({
+        "titulo_id": pa.array(df["titulo_id"].to_numpy(dtype="int16")),
+        "periodo": pa.array(pd.to_datetime(df["periodo"]).dt.date, pa.date32()),
+        "mes": pa.array(df["mes"].to_numpy(dtype="int8")),
+        "acao": pa.array(df["acao"].astype(str)).dictionary_encode().cast(ESQUEMA.field("acao").type),
+        "valor_centavos": pa.array(centavos(df)),
+    }, schema=ESQUEMA)
+
+def _chave(t: pa.Table):
+    # (periodo, acao) como um inteiro: dias * 2 + (acao == venda)
+    venda = pc.cast(pc.equal(pc.cast(t["acao"], pa.string()), "venda"), pa.int32())
+    return pc.add(pc.multiply(pc.cast(t["periodo"], pa.int32()), 2), venda)
+
+def _dir_particao(raiz: str, categoria: str, ano: int) -> str:
+    # mesmo escape (URI) que o pyarrow usa para ler partições hive
+    return os.path.join(raiz, f"categoria_titulo={quote(categoria, safe='')}", f"ano={ano}")
+
+def _gravar(pasta: str, tabela: pa.Table):
+    os.makedirs(pasta, exist_ok=True)
+    destino = os.path.join(pasta, ARQUIVO)
+    tmp = f"{destino}.{os.getpid()}.tmp"
+    # ordenado por (periodo, acao): estatísticas de periodo justas em cada row group
+    pq.write_table(tabela.take(pc.sort_indices(_chave(tabela))), tmp,
+                   compression="zstd", use_dictionary=True, write_statistics=True, row_group_size=ROW_GROUP)
+    os.replace(tmp, destino)
+
+def _particoes(df: pd.DataFrame):
+    chaves = pd.DataFrame({"categoria": df["categoria_titulo"].astype(str), "ano": pd.to_datetime(df["periodo"]).dt.year})
+    for (categoria, ano), pos in chaves.groupby(["categoria", "ano"], sort=True).indices.items():
+        yield categoria, int(ano), df.iloc[pos]
+
+def escrever(df: pd.DataFrame, substituir: bool = False, raiz: str = DATASET_PATH) -> int:
+    """grava o frame tidy no dataset; devolve o nº de partições escritas
+
+    substituir=True reconstrói o dataset inteiro a partir de `df`; senão as linhas de `df` são
+    mescladas (upsert por periodo/acao) nas partições que tocam, e as demais ficam como estão.
+    """
+    if substituir:
+        tmp = f"{raiz}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        n = 0
+        try:
+            for categoria, ano, parte in _particoes(df):
+                _gravar(_dir_particao(tmp, categoria, ano), _tabela(parte))
+                n += 1
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        os.makedirs(tmp, exist_ok=True)
+        antigo = f"{raiz}.{os.getpid()}.old"
+        if os.path.exists(raiz):
+            os.rename(raiz, antigo)
+        os.rename(tmp, raiz)
+        shutil.rmtree(antigo, ignore_errors=True)
+        return n
+    n = 0
+    for categoria, ano, parte in _particoes(df):
+        pasta = _dir_particao(raiz, categoria, ano)
+        novo = _tabela(parte)
+        existente = os.path.join(pasta, ARQUIVO)
+        if os.path.exists(existente):
+            # linhas novas prevalecem sobre as gravadas com a mesma chave
+            antigo = pq.read_table(existente, schema=ESQUEMA)
+            novo = pa.concat_tables([antigo.filter(pc.invert(pc.is_in(_chave(antigo), _chave(novo)))), novo])
+        _gravar(pasta, novo)
+        n += 1
+    return n
+
+def abrir(raiz: str = DATASET_PATH) -> ds.Dataset:
+    return ds.dataset(raiz, format="parquet", partitioning=ds.partitioning(PARTICOES, flavor="hive"))
+
+def filtro(titulo_ids: Optional[list] = None, data_inicio: Optional[date] = None, data_fim: Optional[date] = None, acao: Optional[str] = None):
+    """expressão do pyarrow.dataset: categoria/ano podam partições, periodo/acao vão para as estatísticas"""
+    expr = pc.scalar(True)
+    if titulo_ids is not None:
+        expr &= ds.field("categoria_titulo").isin([_CATEGORIA_POR_ID[t] for t in titulo_ids if t in _CATEGORIA_POR_ID])
+    if data_inicio:
+        expr &= (ds.field("ano") >= data_inicio.year) & (ds.field("periodo") >= data_inicio)
+    if data_fim:
+        expr &= (ds.field("ano") <= data_fim.year) & (ds.field("periodo") <= data_fim)
+    if acao:
+        expr &= ds.field("acao") == acao
+    return expr
+
+def ler(titulo_ids: Optional[list] = None, data_inicio: Optional[date] = None, data_fim: Optional[date] = None, acao: Optional[str] = None,
+        colunas: Optional[list] = None, raiz: str = DATASET_PATH) -> pa.Table:
+    """movimentos (titulo_id, periodo, mes, acao, valor_centavos, categoria_titulo, ano) que atendem aos filtros"""
+    return abrir(raiz).to_table(columns=colunas, filter=filtro(titulo_ids, data_inicio, data_fim, acao))
+
+def mensal(titulo_ids: list, data_inicio: Optional[date] = None, data_fim: Optional[date] = None, acao: Optional[str] = None,
+           raiz: str = DATASET_PATH) -> list:
+    """mesmo contrato de rollups.ler_mensal, calculado direto do dataset (sem o SQLite)"""
+    t = ler(titulo_ids, data_inicio, data_fim, colunas=["titulo_id", "periodo", "ano", "mes", "acao", "valor_centavos"], raiz=raiz)
+    venda = pc.equal(pc.cast(t["acao"], pa.string()), "venda")
+    t = t.append_column("venda", pc.if_else(venda, t["valor_centavos"], 0)) \
+         .append_column("resgate", pc.if_else(venda, 0, t["valor_centavos"])) \
+         .append_column("n_venda", pc.cast(venda, pa.int32())) \
+         .append_column("n_resgate", pc.cast(pc.invert(venda), pa.int32()))
+    g = t.group_by(["titulo_id", "periodo", "ano", "mes"], use_threads=False).aggregate(
+        [("venda", "sum"), ("resgate", "sum"), ("n_venda", "sum"), ("n_resgate", "sum")])
+    if acao:
+        g = g.filter(pc.greater(g[f"n_{acao}_sum"], 0))
+    g = g.sort_by([("periodo", "ascending"), ("titulo_id", "ascending")])
+    return list(zip(g["titulo_id"].to_pylist(), g["ano"].to_pylist(), g["mes"].to_pylist(),
+                    pc.divide(pc.cast(g["venda_sum"], pa.float64()), 100).to_pylist(),
+                    pc.divide(pc.cast(g["resgate_sum"], pa.float64()), 100).to_pylist()))
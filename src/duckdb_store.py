@@ -0,0 +1,138 @@
+import os
+import threading
+from datetime import date
+from typing import Optional
+import duckdb
+from .database import DB_PATH
+from .dataset import DATASET_PATH
+from .rollups import PERIODOS_POR_ANO
+
+# fonte do motor duckdb: "parquet" (dataset do pipeline) ou "sqlite" (ATTACH do data.db, extensão sqlite)
+DUCKDB_FONTE = os.environ.get("TESOURO_DUCKDB_FONTE", "parquet")
+
+# resumo mensal com o mesmo layout de titulos_resumo_mensal, agregado dos movimentos do dataset
+_ORIGEM_PARQUET = """
+SELECT titulo_id, periodo, ano, mes,
+       coalesce(sum(valor_centavos) FILTER (acao = 'venda'), 0) AS venda_centavos,
+       coalesce(sum(valor_centavos) FILTER (acao = 'resgate'), 0) AS resgate_centavos,
+       count(*) FILTER (acao = 'venda') AS n_venda,
+       count(*) FILTER (acao = 'resgate') AS n_resgate
+FROM read_parquet('{raiz}/*/*/*.parquet', hive_partitioning = true,
+                  hive_types = {{'categoria_titulo': VARCHAR, 'ano': SMALLINT}})
+GROUP BY titulo_id, periodo, ano, mes
+"""
+
+class DuckDBStore:
+    """leituras agregadas executadas no DuckDB embutido (execução vetorizada, colunar)
+
+    Mesmo contrato de rollups.ler_* e do ColumnarStore. O resumo mensal é materializado numa
+    tabela em memória do DuckDB, ordenada por (titulo_id, periodo), a partir do dataset Parquet
+    do pipeline ("parquet") ou do data.db anexado somente leitura ("sqlite", extensão sqlite do
+    DuckDB). `invalidar()` incrementa a versão e a próxima leitura recarrega; na fonte parquet,
+    escritas pela API só aparecem depois da próxima carga do pipeline.
+    """
+
+    def __init__(self, fonte: str = DUCKDB_FONTE, raiz: str = DATASET_PATH, db_path: str = DB_PATH):
+        self._con = duckdb.connect()
+        if fonte == "sqlite":
+            self._con.execute(f"ATTACH '{db_path}' AS tesouro (TYPE sqlite, READ_ONLY)")
+            self._origem = "SELECT titulo_id, periodo, ano, mes, venda_centavos, resgate_centavos, n_venda, n_resgate FROM tesouro.titulos_resumo_mensal"
+        else:
+            self._origem = _ORIGEM_PARQUET.format(raiz=raiz.replace("'", "''"))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._versao_carregada = -1
+        self.versao = 0
+
+    def invalidar(self):
+        with self._lock:
+            self.versao += 1
+
+    def recarregar(self):
+        # nova carga do pipeline
+        self.invalidar()
+
+    def _carregar(self):
+        with self._lock:
+            if self._versao_carregada != self.versao:
+                versao = self.versao
+                self._con.execute(f"CREATE OR REPLACE TABLE resumo_mensal AS SELECT * FROM ({self._origem}) ORDER BY titulo_id, periodo")
+                self._versao_carregada = versao
+
+    def _cursor(self):
+        # conexões DuckDB não são thread-safe: um cursor (conexão duplicada) por thread
+        cur = getattr(self._local, "cur", None)
+        if cur is None:
+            cur = self._local.cur = self._con.cursor()
+        return cur
+
+    def _executar(self, sql: str, params: list) -> list:
+        self._carregar()
+        return self._cursor().execute(sql, params).fetchall()
+
+    @staticmethod
+    def _filtros(titulo_ids: list, data_inicio, data_fim, acao) -> tuple:
+        where, params = ["list_contains(?, titulo_id)"], [list(dict.fromkeys(titulo_ids))]
+        if data_inicio:
+            where.append("periodo >= ?")
+            params.append(data_inicio)
+        if data_fim:
+            where.append("periodo <= ?")
+            params.append(data_fim)
+        if acao:
+            where.append(f"n_{acao} > 0")
+        return " AND ".join(where), params
+
+    def mensal(self, titulo_ids: list, data_inicio: Optional[date] = None, data_fim: Optional[date] = None, acao: Optional[str] = None, limite: Optional[int] = None):
+        """mesmo contrato de rollups.ler_mensal"""
+        where, params = self._filtros(titulo_ids, data_inicio, data_fim, acao)
+        sql = f"SELECT titulo_id, ano, mes, venda_centavos / 100, resgate_centavos / 100 FROM resumo_mensal WHERE {where} ORDER BY periodo, titulo_id"
+        if limite:
+            sql, params = f"{sql} LIMIT ?", params + [limite]
+        return self._executar(sql, params)
+
+    def anual(self, titulo_ids: list, data_inicio: Optional[date] = None, data_fim: Optional[date] = None, acao: Optional[str] = None):
+        """mesmo contrato de rollups.ler_anual"""
+        return [(t, a, vv, vr) for t, a, _, vv, vr in self.agregado(titulo_ids, "ano", data_inicio, data_fim, acao)]
+
+    def agregado(self, titulo_ids: list, granularidade: str, data_inicio: Optional[date] = None, data_fim: Optional[date] = None, acao: Optional[str] = None, limite: Optional[int] = None):
+        """mesmo contrato de rollups.ler_agregado"""
+        if granularidade == "mes":
+            return self.mensal(titulo_ids, data_inicio, data_fim, acao, limite)
+        where, params = self._filtros(titulo_ids, data_inicio, data_fim, acao)
+        sub = f"(mes - 1) // {12 // PERIODOS_POR_ANO[granularidade]} + 1"
+        return self._executar(
+            f"SELECT titulo_id, ano, {sub} AS sub, sum(venda_centavos) / 100, sum(resgate_centavos) / 100 "
+            f"FROM resumo_mensal WHERE {where} GROUP BY titulo_id, ano, sub ORDER BY ano, sub, titulo_id", params)
+
+    def indicadores(self, titulo_id: int, granularidade: str = "mes", data_inicio: Optional[date] = None, data_fim: Optional[date] = None):
+        """mesmo contrato de rollups.ler_indicadores (mesmas funções de janela)"""
+        por_ano = PERIODOS_POR_ANO[granularidade]
+        sub = f"(mes - 1) // {12 // por_ano} + 1"
+        serie = f"PARTITION BY titulo_id ORDER BY ano * {por_ano} + sub"
+        fim, params = ("WHERE periodo <= ?", [data_fim]) if data_fim else ("", [])
+        sql = f"""
+        WITH base AS (
+            SELECT titulo_id, ano, {sub} AS sub, max(periodo) AS periodo,
+                   sum(venda_centavos) AS venda, sum(resgate_centavos) AS resgate
+            FROM resumo_mensal {fim} GROUP BY titulo_id, ano, sub
+        ), janelas AS (
+            SELECT *,
+                   sum(venda - resgate) OVER ({serie}) AS posicao,
+                   sum(venda) OVER ({serie} RANGE BETWEEN {por_ano - 1} PRECEDING AND CURRENT ROW) AS venda_12m,
+                   sum(resgate) OVER ({serie} RANGE BETWEEN {por_ano - 1} PRECEDING AND CURRENT ROW) AS resgate_12m,
+                   sum(venda) OVER ({serie} RANGE BETWEEN {por_ano} PRECEDING AND {por_ano} PRECEDING) AS venda_aa,
+                   sum(resgate) OVER ({serie} RANGE BETWEEN {por_ano} PRECEDING AND {por_ano} PRECEDING) AS resgate_aa,
+                   sum(venda) OVER (PARTITION BY ano, sub) AS venda_total,
+                   sum(resgate) OVER (PARTITION BY ano, sub) AS resgate_total
+            FROM base
+        )
+        SELECT ano, sub, venda / 100, resgate / 100, (venda - resgate) / 100, posicao / 100,
+               venda_12m / 100, resgate_12m / 100, (venda_12m - resgate_12m) / 100,
+               venda / nullif(venda_aa, 0) - 1, resgate / nullif(resgate_aa, 0) - 1,
+               venda / nullif(venda_total, 0), resgate / nullif(resgate_total, 0)
+        FROM janelas WHERE titulo_id = ? {"AND periodo >= ?" if data_inicio else ""}
+        ORDER BY ano, sub
+        """
+        params += [titulo_id] + ([data_inicio] if data_inicio else [])
+        return self._executar(sql, params)
@@ -0,0 +1,142 @@
+import io
+import csv
+from typing import Optional
+from .schemas import dumps
+
+# formatos de saída das séries (além do JSON padrão dos endpoints)
+MIME = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+FORMATOS_RE = f"^({'|'.join(MIME)})$"
+
+def negociar_formato(formato: Optional[str], accept: Optional[str]) -> str:
+    """`format=` explícito vence; senão o primeiro tipo do Accept que conhecemos; senão json"""
+    if formato:
+        return formato
+    por_mime = {m: f for f, m in MIME.items()}
+    for parte in (accept or "").split(","):
+        mime = parte.split(";")[0].strip()
+        if mime in por_mime:
+            return por_mime[mime]
+    return "json"
+
+def colunas(granularidade: str) -> list:
+    sub = [] if granularidade == "ano" else [granularidade]
+    return ["id", "categoria_titulo", "ano", *sub, "valor_venda", "valor_resgate"]
+
+class Encoder:
+    """serializa lotes de linhas em bytes; inicio/lote/fim permitem streaming incremental"""
+
+    def __init__(self, cols: list):
+        self.cols = cols
+
+    def inicio(self) -> bytes:
+        return b""
+
+    def lote(self, rows: list) -> bytes:
+        raise NotImplementedError
+
+    def fim(self) -> bytes:
+        return b""
+
+class NdjsonEncoder(Encoder):
+    def lote(self, rows):
+        cols = self.cols
+        return b"".join(dumps(dict(zip(cols, r))) + b"\n" for r in rows)
+
+class CsvEncoder(Encoder):
+    def _linhas(self, rows) -> bytes:
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator="\n").writerows(rows)
+        return buf.getvalue().encode("utf-8")
+
+    def inicio(self):
+        return self._linhas([self.cols])
+
+    def lote(self, rows):
+        return self._linhas(rows)
+
+class ArrowEncoder(Encoder):
+    """Arrow IPC stream: um record batch por lote, enviado assim que é escrito"""
+
+    def __init__(self, cols):
+        import pyarrow as pa
+        super().__init__(cols)
+        self._pa = pa
+        tipos = {"id": pa.int32(), "categoria_titulo": pa.dictionary(pa.int8(), pa.string()),
+                 "ano": pa.int16(), "valor_venda": pa.float64(), "valor_resgate": pa.float64()}
+        self.schema = pa.schema([(c, tipos.get(c, pa.int8())) for c in cols])
+        self._sink = io.BytesIO()
+        self._writer = pa.ipc.new_stream(self._sink, self.schema)
+
+    def _drenar(self) -> bytes:
+        dados = self._sink.getvalue()
+        self._sink.seek(0)
+        self._sink.truncate(0)
+        return dados
+
+    def inicio(self):
+        return self._drenar()
+
+    def _batch(self, rows):
+        pa = self._pa
+        colunas_ = list(zip(*rows)) if rows else [()] * len(self.cols)
+        arrays = []
+        for campo, valores in zip(self.schema, colunas_):
+            if pa.types.is_dictionary(campo.type):
+                arrays.append(pa.array(valores, pa.string()).dictionary_encode().cast(campo.type))
+            else:
+                arrays.append(pa.array(valores, campo.type))
+        return pa.record_batch(arrays, schema=self.schema)
+
+    def lote(self, rows):
+        if rows:
+            self._writer.write_batch(self._batch(rows))
+        return self._drenar()
+
+    def fim(self):
+        self._writer.close()
+        return self._drenar()
+
+class ParquetEncoder(ArrowEncoder):
+    """Parquet precisa do rodapé com as estatísticas: acumula os lotes e grava no fim"""
+
+    def __init__(self, cols):
+        super().__init__(cols)
+        self._batches = []
+
+    def inicio(self):
+        return b""
+
+    def lote(self, rows):
+        if rows:
+            self._batches.append(self._batch(rows))
+        return b""
+
+    def fim(self):
+        import pyarrow.parquet as pq
+        buf = io.BytesIO()
+        pq.write_table(self._pa.Table.from_batches(self._batches, schema=self.schema), buf, compression="zstd")
+        return buf.getvalue()
+
+ENCODERS = {"ndjson": NdjsonEncoder, "csv": CsvEncoder, "arrow": ArrowEncoder, "parquet": ParquetEncoder}
+
+def stream(encoder: Encoder, lotes):
+    yield encoder.inicio()
+    for rows in lotes:
+        dados = encoder.lote(rows)
+        if dados:
+            yield dados
+    yield encoder.fim()
+
+async def astream(encoder: Encoder, lotes):
+    yield encoder.inicio()
+    async for rows in lotes:
+        dados = encoder.lote(rows)
+        if dados:
+            yield dados
+    yield encoder.fim()
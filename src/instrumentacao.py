@@ -0,0 +1,97 @@
+"""instrumentação das etapas do ETL: tempo de parede, CPU, pico de RSS e linhas de entrada/saída
+
+Cada etapa vira um registro (dict). A execução emite os registros como JSON lines e, opcionalmente,
+como métricas no formato textfile do Prometheus (node_exporter --collector.textfile). Só stdlib:
+pode ser importado pela API sem puxar pandas.
+"""
+import os
+import sys
+import json
+import time
+import resource
+from contextlib import contextmanager
+from typing import Optional
+
+# ru_maxrss vem em KiB no Linux e em bytes no macOS
+_RSS_UNIDADE = 1 if sys.platform == "darwin" else 1024
+
+def rss_pico() -> int:
+    """pico de RSS (bytes) do processo e dos filhos já encerrados"""
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * _RSS_UNIDADE
+
+class Etapas:
+    """coletor de registros por etapa; `etapa()` é um context manager que mede o bloco
+
+    O dict devolvido pelo `with` aceita `linhas_saida` (e outros campos) preenchidos pelo bloco.
+    Registros de processos filhos (parse em paralelo) entram via `incorporar`.
+    """
+
+    def __init__(self, **rotulos):
+        self.rotulos = rotulos
+        self.registros = []
+
+    @contextmanager
+    def etapa(self, nome: str, linhas_entrada: Optional[int] = None, **rotulos):
+        reg = {"etapa": nome, **rotulos, "linhas_entrada": linhas_entrada, "linhas_saida": None}
+        t0, c0 = time.perf_counter(), time.process_time()
+        try:
+            yield reg
+            reg["ok"] = True
+        except BaseException as e:
+            reg["ok"], reg["erro"] = False, type(e).__name__
+            raise
+        finally:
+            reg["parede_s"] = round(time.perf_counter() - t0, 6)
+            reg["cpu_s"] = round(time.process_time() - c0, 6)
+            reg["rss_pico_bytes"] = rss_pico()
+            reg["pid"] = os.getpid()
+            self.registros.append(reg)
+
+    def incorporar(self, registros: list):
+        self.registros += registros
+
+    def jsonl(self) -> str:
+        return "".join(json.dumps({**self.rotulos, **r}, ensure_ascii=False, default=str) + "\n" for r in self.registros)
+
+    def emitir(self, destino: str = "-"):
+        """JSON lines em `destino` (arquivo, acrescentado) ou no stderr ("-")"""
+        if destino == "-":
+            sys.stderr.write(self.jsonl())
+        else:
+            with open(destino, "a", encoding="utf-8") as f:
+                f.write(self.jsonl())
+
+    def prometheus(self, path: str, prefixo: str = "tesouro_etl"):
+        """métricas da execução no formato textfile do Prometheus, gravadas de forma atômica
+
+        Etapas repetidas (uma por planilha) são somadas; o pico de RSS é o maior entre elas.
+        """
+        por_etapa = {}
+        for r in self.registros:
+            acc = por_etapa.setdefault(r["etapa"], {"parede_s": 0.0, "cpu_s": 0.0, "rss_pico_bytes": 0, "linhas_entrada": 0, "linhas_saida": 0, "ok": 1})
+            acc["parede_s"] += r["parede_s"]
+            acc["cpu_s"] += r["cpu_s"]
+            acc["rss_pico_bytes"] = max(acc["rss_pico_bytes"], r["rss_pico_bytes"])
+            acc["linhas_entrada"] += r["linhas_entrada"] or 0
+            acc["linhas_saida"] += r["linhas_saida"] or 0
+            acc["ok"] &= int(r["ok"])
+        metricas = [
+            ("etapa_segundos", "parede_s", "tempo de parede por etapa na última execução"),
+            ("etapa_cpu_segundos", "cpu_s", "tempo de CPU por etapa na última execução"),
+            ("etapa_rss_pico_bytes", "rss_pico_bytes", "pico de RSS ao fim da etapa"),
+            ("etapa_linhas_entrada", "linhas_entrada", "linhas recebidas pela etapa"),
+            ("etapa_linhas_saida", "linhas_saida", "linhas produzidas pela etapa"),
+            ("etapa_sucesso", "ok", "1 se a etapa terminou sem erro"),
+        ]
+        linhas = []
+        for nome, campo, ajuda in metricas:
+            linhas += [f"# HELP {prefixo}_{nome} {ajuda}", f"# TYPE {prefixo}_{nome} gauge"]
+            linhas += [f'{prefixo}_{nome}{{etapa="{etapa}"}} {acc[campo]}' for etapa, acc in por_etapa.items()]
+        linhas += [f"# HELP {prefixo}_ultima_execucao_timestamp_segundos fim da última execução (epoch)",
+                   f"# TYPE {prefixo}_ultima_execucao_timestamp_segundos gauge",
+                   f"{prefixo}_ultima_execucao_timestamp_segundos {time.time():.3f}"]
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("\n".join(linhas) + "\n")
+        os.replace(tmp, path)
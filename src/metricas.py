@@ -0,0 +1,196 @@
+"""métricas da API por requisição: latência por rota, consultas SQL e instâncias ORM carregadas
+
+`MetricasMiddleware` (ASGI) abre um contexto por requisição numa contextvar; os eventos do
+SQLAlchemy ligados em `database.py` (todo engine de `make_engine` e todos os mappers) somam nele as
+consultas, o tempo de SQL e as instâncias carregadas. A contextvar acompanha a requisição no
+threadpool (modo sync), no greenlet do AsyncSession (modo async) e na iteração do streaming.
+
+Ao fim da requisição os números vão para o `coletor` (servido em /metrics no formato texto do
+Prometheus; cada processo tem o seu). O cabeçalho Server-Timing sai no início da resposta, então
+não inclui o SQL feito durante o corpo de uma resposta em streaming. Consultas acima de
+TESOURO_SQL_LENTO_MS vão para o logger "tesouro.sql.lento" com o statement e os parâmetros.
+"""
+import os
+import time
+import logging
+import threading
+from contextvars import ContextVar
+
+SQL_LENTO_S = float(os.environ.get("TESOURO_SQL_LENTO_MS", "200")) / 1000
+PARAMS_MAX_CHARS = 500
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 5, 10, 25, 50, 100)
+
+log_lento = logging.getLogger("tesouro.sql.lento")
+
+class Requisicao:
+    __slots__ = ("inicio", "consultas", "sql_s", "orm_linhas")
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.sql_s = 0.0
+        self.orm_linhas = 0
+
+    def server_timing(self) -> str:
+        total = (time.perf_counter() - self.inicio) * 1000
+        return (f'total;dur={total:.1f}, sql;dur={self.sql_s * 1000:.1f};desc="consultas={self.consultas}", '
+                f'app;dur={total - self.sql_s * 1000:.1f}, orm;desc="instancias={self.orm_linhas}"')
+
+_atual: ContextVar = ContextVar("tesouro_requisicao", default=None)
+
+# --- eventos do SQLAlchemy (ligados em database.py) ---
+
+def sql_inicio(conn, cursor, statement, parameters, context, executemany):
+    # pilha em conn.info: a conexão não executa dois statements ao mesmo tempo, mas um evento
+    # de conexão (pragmas, BEGIN) pode rodar no meio de outro
+    conn.info.setdefault("metricas_t0", []).append(time.perf_counter())
+
+def sql_fim(conn, cursor, statement, parameters, context, executemany):
+    dur = time.perf_counter() - conn.info["metricas_t0"].pop()
+    req = _atual.get()
+    if req is not None:
+        req.consultas += 1
+        req.sql_s += dur
+    if dur >= SQL_LENTO_S:
+        coletor.sql_lenta()
+        log_lento.warning("%.1f ms: %s | parâmetros: %s", dur * 1000, " ".join(statement.split()), _params(parameters, executemany))
+
+def sql_erro(contexto):
+    # o after_cursor_execute não roda quando o statement falha
+    conn = contexto.connection
+    if conn is not None and conn.info.get("metricas_t0"):
+        conn.info["metricas_t0"].pop()
+
+def orm_carregada(target, context):
+    req = _atual.get()
+    if req is not None:
+        req.orm_linhas += 1
+
+def _params(parameters, executemany: bool) -> str:
+    if executemany:
+        texto = f"{len(parameters)} conjuntos, o 1º: {parameters[0]!r}" if parameters else "[]"
+    else:
+        texto = repr(parameters)
+    return texto if len(texto) <= PARAMS_MAX_CHARS else texto[:PARAMS_MAX_CHARS] + "..."
+
+# --- agregação por rota ---
+
+class _Histograma:
+    __slots__ = ("limites", "contagens", "soma", "n")
+
+    def __init__(self, limites: tuple):
+        self.limites = limites
+        self.contagens = [0] * len(limites)
+        self.soma = 0.0
+        self.n = 0
+
+    def observar(self, valor: float):
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.contagens[i] += 1
+                break
+        self.soma += valor
+        self.n += 1
+
+    def linhas(self, nome: str, rotulos: str) -> list:
+        out, acumulado = [], 0
+        for limite, c in zip(self.limites, self.contagens):
+            acumulado += c
+            out.append(f'{nome}_bucket{{{rotulos},le="{limite:g}"}} {acumulado}')
+        out.append(f'{nome}_bucket{{{rotulos},le="+Inf"}} {self.n}')
+        out.append(f"{nome}_sum{{{rotulos}}} {self.soma:.6g}")
+        out.append(f"{nome}_count{{{rotulos}}} {self.n}")
+        return out
+
+class _Rota:
+    __slots__ = ("latencia", "consultas", "sql_s", "orm_linhas", "status")
+
+    def __init__(self):
+        self.latencia = _Histograma(BUCKETS_SEGUNDOS)
+        self.consultas = _Histograma(BUCKETS_CONSULTAS)
+        self.sql_s = 0.0
+        self.orm_linhas = 0
+        self.status = {}
+
+class Coletor:
+    """acumula as requisições por (método, rota) e renderiza no formato texto do Prometheus"""
+
+    def __init__(self, prefixo: str = "tesouro_api"):
+        self.prefixo = prefixo
+        self.rotas = {}
+        self.sql_lentas = 0
+        self._lock = threading.Lock()
+
+    def registrar(self, metodo: str, rota: str, status: int, req: Requisicao):
+        dur = time.perf_counter() - req.inicio
+        with self._lock:
+            r = self.rotas.get((metodo, rota))
+            if r is None:
+                r = self.rotas[(metodo, rota)] = _Rota()
+            r.latencia.observar(dur)
+            r.consultas.observar(req.consultas)
+            r.sql_s += req.sql_s
+            r.orm_linhas += req.orm_linhas
+            r.status[status] = r.status.get(status, 0) + 1
+
+    def sql_lenta(self):
+        with self._lock:
+            self.sql_lentas += 1
+
+    def prometheus(self) -> str:
+        p = self.prefixo
+        with self._lock:
+            rotas = [(f'metodo="{m}",rota="{rota}"', r) for (m, rota), r in sorted(self.rotas.items())]
+            linhas = [f"# HELP {p}_requisicoes_total requisições atendidas por rota e status",
+                      f"# TYPE {p}_requisicoes_total counter"]
+            linhas += [f'{p}_requisicoes_total{{{rot},status="{s}"}} {n}' for rot, r in rotas for s, n in sorted(r.status.items())]
+            linhas += [f"# HELP {p}_requisicao_segundos latência por rota (até o fim do corpo da resposta)",
+                       f"# TYPE {p}_requisicao_segundos histogram"]
+            for rot, r in rotas:
+                linhas += r.latencia.linhas(f"{p}_requisicao_segundos", rot)
+            linhas += [f"# HELP {p}_requisicao_sql_consultas statements SQL executados por requisição",
+                       f"# TYPE {p}_requisicao_sql_consultas histogram"]
+            for rot, r in rotas:
+                linhas += r.consultas.linhas(f"{p}_requisicao_sql_consultas", rot)
+            linhas += [f"# HELP {p}_sql_segundos_total tempo gasto em SQL pelas requisições da rota",
+                       f"# TYPE {p}_sql_segundos_total counter"]
+            linhas += [f"{p}_sql_segundos_total{{{rot}}} {r.sql_s:.6g}" for rot, r in rotas]
+            linhas += [f"# HELP {p}_orm_linhas_total instâncias ORM carregadas pelas requisições da rota",
+                       f"# TYPE {p}_orm_linhas_total counter"]
+            linhas += [f"{p}_orm_linhas_total{{{rot}}} {r.orm_linhas}" for rot, r in rotas]
+            linhas += [f"# HELP {p}_sql_lentas_total statements acima de TESOURO_SQL_LENTO_MS (API e carga)",
+                       f"# TYPE {p}_sql_lentas_total counter",
+                       f"{p}_sql_lentas_total {self.sql_lentas}"]
+        return "\n".join(linhas) + "\n"
+
+coletor = Coletor()
+
+class MetricasMiddleware:
+    """middleware ASGI: contexto por requisição, Server-Timing na resposta e registro no `coletor`"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        req = Requisicao()
+        token = _atual.set(req)
+        status = 500
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+                mensagem["headers"] = [*mensagem.get("headers", ()), (b"server-timing", req.server_timing().encode())]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _atual.reset(token)
+            # rota com o template do path (o router grava "route" no scope); sem rota, um rótulo
+            # fixo para 404s não criarem uma série por URL
+            rota = getattr(scope.get("route"), "path", "(sem rota)")
+            coletor.registrar(scope["method"], rota, status, req)
@@ -0,0 +1,57 @@
+"""migrações de esquema para bancos já existentes (idempotentes)
+
+Rodadas por `pipeline.init_db()` e no lifespan da API (`preparar_banco`, antes do create_all);
+também podem ser executadas à parte, com a criação das tabelas: `python -m src.migrations`.
+"""
+from sqlalchemy import inspect, text
+from .database import engine, Base
+from .models import ResumoMensal, ResumoAnual
+from .rollups import refresh_rollups
+
+def _colunas(conn, tabela: str) -> set:
+    insp = inspect(conn)
+    if not insp.has_table(tabela):
+        return set()
+    return {c["name"] for c in insp.get_columns(tabela)}
+
+def _valores_em_centavos(conn) -> bool:
+    """valor_milhoes/valor_reais (Float) -> valor_centavos (inteiro); resumos recriados em centavos"""
+    cols = _colunas(conn, "titulos_movimentos")
+    if not cols or "valor_centavos" in cols:
+        return False
+    conn.execute(text("ALTER TABLE titulos_movimentos ADD COLUMN valor_centavos BIGINT NOT NULL DEFAULT 0"))
+    conn.execute(text("UPDATE titulos_movimentos SET valor_centavos = CAST(ROUND(valor_reais * 100) AS BIGINT)"))
+    for coluna in ("valor_reais", "valor_milhoes"):
+        conn.execute(text(f"ALTER TABLE titulos_movimentos DROP COLUMN {coluna}"))
+    # os resumos são derivados dos movimentos: recriados no novo formato
+    tabelas = [ResumoMensal.__table__, ResumoAnual.__table__]
+    for tabela in tabelas:
+        tabela.drop(conn, checkfirst=True)
+    Base.metadata.create_all(conn, tables=tabelas)
+    refresh_rollups(conn)
+    return True
+
+MIGRACOES = [_valores_em_centavos]
+
+def migrar(eng=engine) -> list:
+    """aplica as migrações pendentes numa transação; devolve os nomes das aplicadas"""
+    with eng.begin() as conn:
+        aplicadas = [m.__name__.lstrip("_") for m in MIGRACOES if m(conn)]
+    if aplicadas and eng.dialect.name == "sqlite":
+        # DROP COLUMN deixa as páginas livres no arquivo; VACUUM devolve o espaço (fora de transação)
+        raw = eng.raw_connection()
+        try:
+            raw.driver_connection.execute("VACUUM")
+        finally:
+            raw.close()
+    return aplicadas
+
+def preparar_banco(eng=engine) -> list:
+    """migrações pendentes + tabelas que faltam; passo explícito de subida da API e de deploy"""
+    aplicadas = migrar(eng)
+    Base.metadata.create_all(bind=eng)
+    return aplicadas
+
+if __name__ == "__main__":
+    aplicadas = preparar_banco()
+    print(f"migrações aplicadas: {', '.join(aplicadas)}" if aplicadas else "banco já atualizado")
@@ -1,7 +1,11 @@
-from sqlalchemy import Column, Integer, String, Float, Date, CheckConstraint, UniqueConstraint, ForeignKey, Index
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, CheckConstraint, UniqueConstraint, ForeignKey, Index
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 from .database import Base
 
+def para_centavos(reais: float) -> int:
+    return round(reais * 100)
+
 class Titulo(Base):
     __tablename__ = "titulos"
     id = Column(Integer, primary_key=True, autoincrement=False)
@@ -16,14 +20,55 @@ class Movimento(Base):
     ano = Column(Integer, nullable=False)
     mes = Column(Integer, nullable=False)
     acao = Column(String, nullable=False)  # 'venda' ou 'resgate'
-    valor_milhoes = Column(Float, nullable=False)
-    valor_reais = Column(Float, nullable=False)
+    # valor exato em centavos; reais e milhões são derivados
+    valor_centavos = Column(BigInteger, nullable=False)
 
     titulo = relationship("Titulo", back_populates="movimentos")
 
+    @hybrid_property
+    def valor_reais(self) -> float:
+        return self.valor_centavos / 100
+
+    @hybrid_property
+    def valor_milhoes(self) -> float:
+        return self.valor_centavos / 100_000_000
+
     __table_args__ = (
         CheckConstraint("acao in ('venda','resgate')", name="ck_acao"),
         UniqueConstraint("titulo_id", "periodo", "acao", name="uq_mov_unico"),
         Index("idx_mov_titulo_periodo", "titulo_id", "periodo"),
         Index("idx_mov_acao_periodo", "acao", "periodo"),
-    )
\ No newline at end of file
+    )
+
+# resumos materializados (mantidos pelo ETL e pelos endpoints de escrita)
+class ResumoMensal(Base):
+    __tablename__ = "titulos_resumo_mensal"
+    titulo_id = Column(Integer, ForeignKey("titulos.id"), primary_key=True)
+    periodo = Column(Date, primary_key=True)
+    ano = Column(Integer, nullable=False)
+    mes = Column(Integer, nullable=False)
+    venda_centavos = Column(BigInteger, nullable=False, default=0)
+    resgate_centavos = Column(BigInteger, nullable=False, default=0)
+    n_venda = Column(Integer, nullable=False, default=0)
+    n_resgate = Column(Integer, nullable=False, default=0)
+
+class ResumoAnual(Base):
+    __tablename__ = "titulos_resumo_anual"
+    titulo_id = Column(Integer, ForeignKey("titulos.id"), primary_key=True)
+    ano = Column(Integer, primary_key=True)
+    venda_centavos = Column(BigInteger, nullable=False, default=0)
+    resgate_centavos = Column(BigInteger, nullable=False, default=0)
+    n_venda = Column(Integer, nullable=False, default=0)
+    n_resgate = Column(Integer, nullable=False, default=0)
+
+# controle do ETL incremental
+class FonteCarga(Base):
+    __tablename__ = "etl_fontes"
+    caminho = Column(String, primary_key=True)
+    sha256 = Column(String, nullable=False)
+    carregado_em = Column(DateTime, nullable=False)
+
+class Watermark(Base):
+    __tablename__ = "etl_watermarks"
+    titulo_id = Column(Integer, ForeignKey("titulos.id"), primary_key=True)
+    ultimo_periodo = Column(Date, nullable=False)
@@ -1,60 +1,271 @@
 import os
+import sys
+import glob
+import pstats
+import cProfile
+import hashlib
+import argparse
+from datetime import datetime
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
-from .database import engine, Base, SessionLocal
-from .models import Titulo, Movimento
-from .utils import TITULOS_ID_MAP, read_and_transform_excel
+from sqlalchemy import select, func
+from .database import engine, Base, SessionLocal, insert_stmt, ETL_VERSAO_PATH
+from .rollups import refresh_rollups
+from .migrations import migrar
+from . import dataset, snapshot
+from .instrumentacao import Etapas
+from .models import Titulo, Movimento, ResumoMensal, FonteCarga, Watermark
+from .utils import TITULOS_ID_MAP, read_and_transform_excel, file_sha256, planilhas, centavos
 
 EXCEL_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "dados", "Series_Temporais_Tesouro_Direto.xlsx")
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "dados", "data.db")
-PARQUET_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "dados", "titulos_tesouro.parquet")
+BATCH_SIZE = int(os.environ.get("ETL_BATCH_SIZE", "5000"))
+# processos para o parse das planilhas (padrão: um por núcleo)
+ETL_WORKERS = int(os.environ.get("ETL_WORKERS", "0")) or os.cpu_count() or 1
+CHAVE = ["titulo_id", "periodo", "acao"]
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
+def init_db(etapas: Etapas = None):
+    etapas = etapas or Etapas()
+    with etapas.etapa("migracoes") as reg:
+        reg["linhas_saida"] = len(migrar())
+    with etapas.etapa("esquema"):
+        Base.metadata.create_all(bind=engine)
     # popular tabela de títulos com IDs fixos
-    with SessionLocal() as db:
-        for nome, id_ in TITULOS_ID_MAP.items():
-            if not db.query(Titulo).filter(Titulo.id == id_).first():
-                db.add(Titulo(id=id_, categoria_titulo=nome))
+    with etapas.etapa("titulos", len(TITULOS_ID_MAP)) as reg, SessionLocal() as db:
+        novos = [Titulo(id=id_, categoria_titulo=nome) for nome, id_ in TITULOS_ID_MAP.items()
+                 if not db.query(Titulo).filter(Titulo.id == id_).first()]
+        db.add_all(novos)
         db.commit()
+        reg["linhas_saida"] = len(novos)
+    # bancos anteriores aos resumos: materializa uma vez a partir dos movimentos
+    with engine.begin() as conn:
+        tem_resumo = conn.execute(select(ResumoMensal.titulo_id).limit(1)).first()
+        if not tem_resumo and conn.execute(select(Movimento.id).limit(1)).first():
+            with etapas.etapa("rollups_iniciais"):
+                refresh_rollups(conn)
+
+def _registros(df: pd.DataFrame) -> list:
+    periodos = pd.to_datetime(df["periodo"]).dt.date
+    return [
+        {"titulo_id": int(t), "periodo": p, "ano": int(a), "mes": int(m), "acao": ac, "valor_centavos": int(c)}
+        for t, p, a, m, ac, c in zip(df["titulo_id"], periodos, df["ano"], df["mes"], df["acao"], centavos(df))
+    ]
+
+def upsert_movimentos(df: pd.DataFrame, batch_size: int = BATCH_SIZE, etapas: Etapas = None) -> dict:
+    """carga set-based: um INSERT ... ON CONFLICT(uq_mov_unico) DO UPDATE por lote"""
+    etapas = etapas or Etapas()
+    with etapas.etapa("registros", len(df)) as reg:
+        registros = _registros(df)
+        reg["linhas_saida"] = len(registros)
+    stmt = insert_stmt(Movimento.__table__)
+    # substitui pelo valor do ETL (snapshot confiável)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["titulo_id", "periodo", "acao"],
+        set_={c: stmt.excluded[c] for c in ("ano", "mes", "valor_centavos")},
+    )
+    with engine.begin() as conn:
+        with etapas.etapa("upsert", len(registros)) as reg:
+            antes = conn.execute(select(func.count()).select_from(Movimento.__table__)).scalar_one()
+            for i in range(0, len(registros), batch_size):
+                conn.execute(stmt, registros[i:i + batch_size])
+            depois = conn.execute(select(func.count()).select_from(Movimento.__table__)).scalar_one()
+            inseridos = reg["linhas_saida"] = depois - antes
+        # resumos mensal/anual dos títulos tocados, na mesma transação
+        titulos = {r["titulo_id"] for r in registros}
+        with etapas.etapa("rollups", len(titulos)):
+            refresh_rollups(conn, titulos)
+    return {"inseridos": inseridos, "atualizados": len(registros) - inseridos}
+
+def resolver_fontes(fontes: list) -> list:
+    """arquivos, diretórios (todos os .xlsx) ou globs -> caminhos únicos, em ordem de nome"""
+    paths = []
+    for fonte in fontes:
+        if os.path.isdir(fonte):
+            achados = glob.glob(os.path.join(fonte, "*.xlsx"))
+        elif glob.has_magic(fonte):
+            achados = glob.glob(fonte, recursive=True)
+        else:
+            achados = [fonte] if os.path.isfile(fonte) else []
+        # "~$arquivo.xlsx" é o lock do Excel aberto
+        paths += sorted(p for p in achados if not os.path.basename(p).startswith("~$"))
+    return list(dict.fromkeys(os.path.abspath(p) for p in paths))
+
+def tarefas_leitura(shas: dict, selecao: list = None) -> list:
+    """(caminho, índice da planilha, sha256) de cada planilha a ler; `selecao` por nome ou índice (None = todas)"""
+    tarefas = []
+    for path, sha in shas.items():
+        nomes = planilhas(path)
+        indices = range(len(nomes)) if not selecao else [
+            int(p) if p.isdigit() else nomes.index(p) for p in selecao if p.isdigit() or p in nomes]
+        tarefas += [(path, i, sha) for i in indices]
+    return tarefas
 
-def upsert_movimentos(df: pd.DataFrame):
+def _ler(tarefa: tuple, cache: bool = True) -> tuple:
+    # roda no processo filho: os registros de instrumentação voltam junto com o frame
+    path, sheet, sha = tarefa
+    etapas = Etapas()
+    return read_and_transform_excel(path, cache=cache, sha256=sha, sheet=sheet, etapas=etapas), etapas.registros
+
+def ler_fontes(tarefas: list, workers: int = ETL_WORKERS, cache: bool = True, etapas: Etapas = None) -> pd.DataFrame:
+    """parse + transformação das planilhas em paralelo (ProcessPoolExecutor) e um único frame tidy
+
+    Chaves repetidas entre arquivos/planilhas ficam com a última na ordem das tarefas
+    (arquivos por nome: a carga mensal mais recente prevalece sobre o histórico).
+    """
+    etapas = etapas or Etapas()
+    ler = partial(_ler, cache=cache)
+    if workers > 1 and len(tarefas) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tarefas))) as pool:
+            lidos = list(pool.map(ler, tarefas))
+    else:
+        lidos = [ler(t) for t in tarefas]
+    for _, registros in lidos:
+        etapas.incorporar(registros)
+    frames = [df for df, _ in lidos]
+    if len(frames) == 1:
+        return frames[0]
+    with etapas.etapa("merge", sum(map(len, frames))) as reg:
+        df = pd.concat(frames, ignore_index=True).drop_duplicates(CHAVE, keep="last", ignore_index=True)
+        reg["linhas_saida"] = len(df)
+    return df
+
+def fonte_inalterada(path: str, sha: str) -> bool:
     with SessionLocal() as db:
-        for row in df.itertuples(index=False):
-            existing = db.query(Movimento).filter(
-                Movimento.titulo_id==row.titulo_id,
-                Movimento.periodo==row.periodo,
-                Movimento.acao==row.acao
-            ).first()
-            if existing:
-                # substitui pelo valor do ETL (snapshot confiável)
-                existing.valor_milhoes = float(row.valor_milhoes)
-                existing.valor_reais = float(row.valor_reais)
-                existing.ano = int(row.ano)
-                existing.mes = int(row.mes)
-            else:
-                db.add(Movimento(
-                    titulo_id=int(row.titulo_id),
-                    periodo=row.periodo.date() if hasattr(row.periodo, 'date') else row.periodo,
-                    ano=int(row.ano),
-                    mes=int(row.mes),
-                    acao=row.acao,
-                    valor_milhoes=float(row.valor_milhoes),
-                    valor_reais=float(row.valor_reais),
-                ))
-        db.commit()
+        fonte = db.get(FonteCarga, os.path.abspath(path))
+        return fonte is not None and fonte.sha256 == sha
 
-def main():
-    os.makedirs(os.path.join(os.path.dirname(os.path.dirname(__file__)), "dados"), exist_ok=True)
-    init_db()
-    df = read_and_transform_excel(EXCEL_PATH)
-    # Parquet (opcional)
+def registrar_fontes(shas: dict):
+    stmt = insert_stmt(FonteCarga.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["caminho"],
+        set_={"sha256": stmt.excluded.sha256, "carregado_em": stmt.excluded.carregado_em},
+    )
+    agora = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(stmt, [{"caminho": os.path.abspath(p), "sha256": sha, "carregado_em": agora} for p, sha in shas.items()])
+
+def delta_movimentos(df: pd.DataFrame) -> pd.DataFrame:
+    """linhas novas (após a watermark do título) ou cujo valor mudou em relação ao banco"""
+    with engine.connect() as conn:
+        marcas = dict(conn.execute(select(Watermark.titulo_id, Watermark.ultimo_periodo)).all())
+        if not marcas:
+            return df
+        periodo = pd.to_datetime(df["periodo"])
+        limite = pd.to_datetime(df["titulo_id"].map(marcas))
+        novo = limite.isna() | (periodo > limite)
+        antigos = df[~novo]
+        if antigos.empty:
+            return df[novo]
+        existentes = pd.read_sql(
+            select(Movimento.titulo_id, Movimento.periodo, Movimento.acao, Movimento.valor_centavos)
+            .where(Movimento.periodo <= max(marcas.values())),
+            conn,
+        )
+    existentes["periodo"] = pd.to_datetime(existentes["periodo"])
+    chaves = ["titulo_id", "periodo", "acao"]
+    cmp = antigos[chaves].assign(
+        titulo_id=antigos["titulo_id"].astype("int64"), periodo=pd.to_datetime(antigos["periodo"]),
+        acao=antigos["acao"].astype(str), valor_centavos=centavos(antigos),
+    ).merge(existentes, on=chaves, how="left", suffixes=("", "_db"))
+    mudou = (cmp["valor_centavos"] != cmp["valor_centavos_db"]).to_numpy()
+    return pd.concat([df[novo], antigos[mudou]])
+
+def atualizar_watermarks(df: pd.DataFrame):
+    if df.empty:
+        return
+    ultimos = pd.to_datetime(df["periodo"]).groupby(df["titulo_id"].astype("int64")).max()
+    stmt = insert_stmt(Watermark.__table__)
+    # a watermark nunca recua (uma carga parcial não apaga o que já foi visto)
+    maior = func.greatest if engine.dialect.name == "postgresql" else func.max
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["titulo_id"],
+        set_={"ultimo_periodo": maior(Watermark.ultimo_periodo, stmt.excluded.ultimo_periodo)},
+    )
+    with engine.begin() as conn:
+        conn.execute(stmt, [{"titulo_id": int(t), "ultimo_periodo": p.date()} for t, p in ultimos.items()])
+
+def publicar_versao(sha: str):
+    """sinaliza aos processos da API que os dados mudaram (eles comparam o mtime)"""
+    tmp = f"{ETL_VERSAO_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(f"{sha} {datetime.now().isoformat()}\n")
+    os.replace(tmp, ETL_VERSAO_PATH)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ETL Tesouro Direto (Excel → SQLite/Parquet)")
+    parser.add_argument("fontes", nargs="*", default=[EXCEL_PATH],
+                        help="planilhas .xlsx, diretórios ou globs (padrão: dados/Series_Temporais_Tesouro_Direto.xlsx)")
+    parser.add_argument("--planilhas", type=lambda v: [p.strip() for p in v.split(",")],
+                        help="nomes ou índices das planilhas, separados por vírgula (padrão: todas)")
+    parser.add_argument("--workers", type=int, default=ETL_WORKERS,
+                        help="processos para o parse (padrão: ETL_WORKERS ou nº de núcleos)")
+    parser.add_argument("--full", action="store_true",
+                        help="recarrega todo o histórico, ignorando hash da fonte e watermarks")
+    parser.add_argument("--metricas", default=os.environ.get("ETL_METRICAS", "-"),
+                        help="arquivo (acrescentado) para as métricas das etapas em JSON lines; '-' = stderr (padrão: ETL_METRICAS)")
+    parser.add_argument("--prometheus", default=os.environ.get("ETL_PROMETHEUS"),
+                        help="arquivo .prom (textfile collector do node_exporter) com as métricas da execução")
+    parser.add_argument("--profile", metavar="ARQUIVO",
+                        help="grava o perfil cProfile da execução (pstats) e imprime as funções mais caras no stderr; "
+                             "o parse em processos filhos não entra no perfil (use --workers 1)")
+    args = parser.parse_args(argv)
+
+    etapas = Etapas(execucao=datetime.now().isoformat(timespec="seconds"))
+    perfil = cProfile.Profile() if args.profile else None
     try:
-        df.to_parquet(PARQUET_PATH, index=False)
-    except Exception:
-        pass
+        if perfil:
+            perfil.enable()
+        with etapas.etapa("execucao"):
+            _executar(args, parser, etapas)
+    finally:
+        if perfil:
+            perfil.disable()
+            perfil.dump_stats(args.profile)
+            pstats.Stats(perfil, stream=sys.stderr).sort_stats("cumulative").print_stats(25)
+        if args.metricas:
+            etapas.emitir(args.metricas)
+        if args.prometheus:
+            etapas.prometheus(args.prometheus)
+
+def _executar(args, parser, etapas: Etapas):
+    os.makedirs(os.path.join(os.path.dirname(os.path.dirname(__file__)), "dados"), exist_ok=True)
+    init_db(etapas)
+    with etapas.etapa("fontes", len(args.fontes)) as reg:
+        shas = {p: file_sha256(p) for p in resolver_fontes(args.fontes)}
+        reg["linhas_saida"] = len(shas)
+    if not shas:
+        parser.error(f"nenhuma planilha encontrada em: {' '.join(args.fontes)}")
+    # versão publicada: hash do arquivo (fonte única) ou dos hashes de todas as fontes
+    sha = next(iter(shas.values())) if len(shas) == 1 else hashlib.sha256("".join(sorted(shas.values())).encode()).hexdigest()
+    if not args.full and all(fonte_inalterada(p, h) for p, h in shas.items()):
+        print(f"ETL ignorado: fonte inalterada ({sha[:12]}). DB: {engine.url.render_as_string(hide_password=True)}")
+        return
+    # se alguma fonte mudou, todas são relidas (as inalteradas saem do cache Parquet) para o merge ficar completo
+    tarefas = tarefas_leitura(shas, args.planilhas)
+    if not tarefas:
+        parser.error(f"nenhuma das planilhas {args.planilhas} encontrada nas fontes")
+    df = ler_fontes(tarefas, args.workers, etapas=etapas)
+    # incremental: só o que é novo ou mudou
+    with etapas.etapa("delta", len(df)) as reg:
+        carga = df if args.full else delta_movimentos(df)
+        reg["linhas_saida"] = len(carga)
+    # dataset Parquet antes do banco: se falhar, a fonte não é registrada e a próxima execução refaz tudo
+    completo = args.full or not os.path.isdir(dataset.DATASET_PATH)
+    with etapas.etapa("parquet", len(df) if completo else len(carga)) as reg:
+        particoes = reg["particoes"] = dataset.escrever(df if completo else carga, substituir=completo)
+        reg["linhas_saida"] = reg["linhas_entrada"]
     # Carrega no SQLite
-    upsert_movimentos(df)
-    print(f"ETL concluído. Registros processados: {len(df)}. DB: {DB_PATH}")
+    res = upsert_movimentos(carga, etapas=etapas)
+    # snapshot Arrow dos workers da API, trocado antes de sinalizar a nova versão
+    with etapas.etapa("snapshot") as reg:
+        reg["linhas_saida"] = snapshot.publicar(session_factory=SessionLocal)
+    with etapas.etapa("finalizacao", len(df)):
+        atualizar_watermarks(df)
+        registrar_fontes(shas)
+        publicar_versao(sha)
+    print(f"ETL concluído. Fontes: {len(shas)}, registros processados: {len(df)}, carregados: {len(carga)} "
+          f"(inseridos: {res['inseridos']}, atualizados: {res['atualizados']}), partições Parquet gravadas: {particoes}. "
+          f"DB: {engine.url.render_as_string(hide_password=True)}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,44 @@
+from types import MappingProxyType
+from typing import Optional
+from sqlalchemy import select
+from .database import ReadSessionLocal
+from .models import Titulo
+from .titulos import TITULOS_ID_MAP
+
+class TituloRegistry:
+    """mapa imutável id <-> categoria dos títulos, compartilhado pelos endpoints
+
+    Montado a partir de TITULOS_ID_MAP e da tabela `titulos` (que prevalece);
+    `carregar()` troca os mapas inteiros, então leitores nunca veem estado parcial.
+    """
+
+    def __init__(self, session_factory=ReadSessionLocal):
+        self._session_factory = session_factory
+        self._por_id = None
+        self._por_categoria = None
+
+    def carregar(self):
+        with self._session_factory() as db:
+            rows = db.execute(select(Titulo.id, Titulo.categoria_titulo)).all()
+        por_id = {id_: nome for nome, id_ in TITULOS_ID_MAP.items()}
+        por_id.update(dict(rows))
+        self._por_id = MappingProxyType(por_id)
+        self._por_categoria = MappingProxyType({nome: id_ for id_, nome in por_id.items()})
+
+    @property
+    def por_id(self) -> MappingProxyType:
+        if self._por_id is None:
+            self.carregar()
+        return self._por_id
+
+    @property
+    def por_categoria(self) -> MappingProxyType:
+        if self._por_categoria is None:
+            self.carregar()
+        return self._por_categoria
+
+    def categoria(self, titulo_id: int) -> Optional[str]:
+        return self.por_id.get(titulo_id)
+
+    def titulo_id(self, categoria: str) -> Optional[int]:
+        return self.por_categoria.get(categoria)
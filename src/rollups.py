@@ -0,0 +1,240 @@
+from datetime import date
+from functools import lru_cache
+from typing import Iterable, Optional
+from sqlalchemy import select, insert, delete, func, case, and_, literal, literal_column, bindparam, type_coerce, Float
+from .database import insert_stmt, sql_fixo
+from .models import Movimento, ResumoMensal, ResumoAnual
+
+# valores em centavos (inteiros): as somas são exatas; a conversão para reais é feita só na leitura
+_VALORES = ("venda_centavos", "resgate_centavos", "n_venda", "n_resgate")
+
+# granularidade -> períodos por ano (mes é o próprio resumo mensal)
+PERIODOS_POR_ANO = {"mes": 12, "trimestre": 4, "semestre": 2, "ano": 1}
+
+def refresh_rollups(conn, titulo_ids: Optional[Iterable[int]] = None):
+    """recalcula em bloco os resumos mensal/anual (todos ou só dos títulos informados)"""
+    ids = sorted(titulo_ids) if titulo_ids is not None else None
+    M, R = Movimento, ResumoMensal
+    for tabela in (ResumoMensal.__table__, ResumoAnual.__table__):
+        stmt = delete(tabela)
+        if ids is not None:
+            stmt = stmt.where(tabela.c.titulo_id.in_(ids))
+        conn.execute(stmt)
+
+    venda = M.acao == "venda"
+    mensal = select(
+        M.titulo_id, M.periodo, M.ano, M.mes,
+        func.sum(case((venda, M.valor_centavos), else_=0)),
+        func.sum(case((venda, 0), else_=M.valor_centavos)),
+        func.sum(case((venda, 1), else_=0)),
+        func.sum(case((venda, 0), else_=1)),
+    ).group_by(M.titulo_id, M.periodo, M.ano, M.mes)
+    if ids is not None:
+        mensal = mensal.where(M.titulo_id.in_(ids))
+    conn.execute(insert(ResumoMensal.__table__).from_select(
+        ["titulo_id", "periodo", "ano", "mes", *_VALORES], mensal))
+
+    anual = select(
+        R.titulo_id, R.ano,
+        func.sum(R.venda_centavos), func.sum(R.resgate_centavos), func.sum(R.n_venda), func.sum(R.n_resgate),
+    ).group_by(R.titulo_id, R.ano)
+    if ids is not None:
+        anual = anual.where(R.titulo_id.in_(ids))
+    conn.execute(insert(ResumoAnual.__table__).from_select(["titulo_id", "ano", *_VALORES], anual))
+
+def _upsert_aditivo(tabela, pk: tuple, substituir: tuple = ()):
+    # colunas em `substituir` recebem o valor novo em vez da soma
+    stmt = insert_stmt(tabela)
+    return stmt.on_conflict_do_update(
+        index_elements=list(pk),
+        set_={c: stmt.excluded[c] if c in substituir else tabela.c[c] + stmt.excluded[c] for c in _VALORES},
+    )
+
+@lru_cache(maxsize=None)
+def _sql_delta(acao: str, recontar: bool, remover: bool) -> tuple:
+    """statements de stmts_delta para uma ação/modo, montados e compilados uma única vez"""
+    col_n = "n_venda" if acao == "venda" else "n_resgate"
+    M, R = Movimento, ResumoMensal
+    b = {c: bindparam(c) for c in ("titulo_id", "periodo", "ano", "mes", "acao", *_VALORES)}
+    n_mes = n_ano = b[col_n]
+    if recontar:
+        n_mes = select(func.count()).where(M.titulo_id == b["titulo_id"], M.periodo == b["periodo"], M.acao == b["acao"]).scalar_subquery()
+        n_ano = select(func.coalesce(func.sum(getattr(R, col_n)), literal_column("0"))).where(R.titulo_id == b["titulo_id"], R.ano == b["ano"]).scalar_subquery()
+    chaves = (
+        (ResumoMensal.__table__, ("titulo_id", "periodo"), ("ano", "mes"), n_mes),
+        (ResumoAnual.__table__, ("titulo_id", "ano"), (), n_ano),
+    )
+    stmts = []
+    for tabela, pk, extras, n_tabela in chaves:
+        valores = {c: b[c] for c in (*pk, *extras, *_VALORES)}
+        valores[col_n] = n_tabela
+        stmts.append(_upsert_aditivo(tabela, pk, (col_n,) if recontar else ()).values(valores))
+        if remover:
+            # mês/ano sem nenhum movimento deixa de existir no resumo
+            stmts.append(delete(tabela).where(
+                and_(*(tabela.c[c] == b[c] for c in pk)),
+                tabela.c.n_venda + tabela.c.n_resgate <= literal_column("0"),
+            ))
+    return tuple(sql_fixo(stmt) for stmt in stmts)
+
+def stmts_delta(titulo_id: int, periodo: date, acao: str, centavos: int, n: Optional[int] = 0) -> list:
+    """(statement, parâmetros) que somam `centavos` (e `n` movimentos) aos resumos do mês/ano
+
+    n=None reconta a partir de titulos_movimentos os movimentos da ação no mês (e no ano),
+    para quem gravou via upsert e não sabe se o movimento é novo.
+    """
+    venda = acao == "venda"
+    params = {
+        "titulo_id": titulo_id, "periodo": periodo, "ano": periodo.year, "mes": periodo.month, "acao": acao,
+        "venda_centavos": centavos if venda else 0,
+        "resgate_centavos": 0 if venda else centavos,
+        "n_venda": (n or 0) if venda else 0,
+        "n_resgate": 0 if venda else (n or 0),
+    }
+    return [(stmt, params) for stmt in _sql_delta(acao, n is None, n is not None and n < 0)]
+
+def aplicar_delta(db, titulo_id: int, periodo: date, acao: str, centavos: int, n: Optional[int] = 0):
+    """aplica stmts_delta na transação da sessão"""
+    for stmt, params in stmts_delta(titulo_id, periodo, acao, centavos, n):
+        db.execute(stmt, params)
+
+def stmts_delta_lote(movimentos: Iterable[tuple]) -> list:
+    """(stmt, parâmetros) que somam em bloco vários deltas (titulo_id, periodo, acao, centavos, n) aos resumos
+
+    Os deltas são consolidados por mês/ano antes: um executemany por tabela. Só somas (n >= 0).
+    """
+    mensal, anual = {}, {}
+    for titulo_id, periodo, acao, centavos, n in movimentos:
+        i = 0 if acao == "venda" else 1
+        for acc, chave in ((mensal, (titulo_id, periodo)), (anual, (titulo_id, periodo.year))):
+            d = acc.setdefault(chave, [0, 0, 0, 0])
+            d[i] += centavos
+            d[2 + i] += n
+    return [
+        (_upsert_aditivo(ResumoMensal.__table__, ("titulo_id", "periodo")),
+         [{"titulo_id": t, "periodo": p, "ano": p.year, "mes": p.month, **dict(zip(_VALORES, d))} for (t, p), d in mensal.items()]),
+        (_upsert_aditivo(ResumoAnual.__table__, ("titulo_id", "ano")),
+         [{"titulo_id": t, "ano": a, **dict(zip(_VALORES, d))} for (t, a), d in anual.items()]),
+    ]
+
+def aplicar_delta_lote(db, movimentos: Iterable[tuple]):
+    for stmt, params in stmts_delta_lote(movimentos):
+        if params:
+            db.execute(stmt, params)
+
+def _filtro_acao(tabela, acao: Optional[str]):
+    if acao == "venda":
+        return tabela.n_venda > 0
+    if acao == "resgate":
+        return tabela.n_resgate > 0
+    return None
+
+def _reais(centavos):
+    return type_coerce(centavos / literal_column("100.0"), Float)
+
+def stmt_mensal(titulo_ids: list, data_inicio: Optional[date] = None, data_fim: Optional[date] = None, acao: Optional[str] = None, limite: Optional[int] = None):
+    """(titulo_id, ano, mes, valor_venda, valor_resgate) ordenado por período e título (até `limite` linhas)"""
+    R = ResumoMensal
+    q = select(R.titulo_id, R.ano, R.mes, _reais(R.venda_centavos), _reais(R.resgate_centavos)).where(R.titulo_id.in_(titulo_ids))
+    if data_inicio: q = q.where(R.periodo >= data_inicio)
+    if data_fim: q = q.where(R.periodo <= data_fim)
+    if acao: q = q.where(_filtro_acao(R, acao))
+    q = q.order_by(R.periodo, R.titulo_id)
+    return q.limit(limite) if limite else q
+
+def stmt_anual(titulo_ids: list, data_inicio: Optional[date] = None, data_fim: Optional[date] = None, acao: Optional[str] = None):
+    """(titulo_id, ano, valor_venda, valor_resgate) ordenado por ano e título"""
+    if data_inicio is None and data_fim is None:
+        A = ResumoAnual
+        q = select(A.titulo_id, A.ano, _reais(A.venda_centavos), _reais(A.resgate_centavos)).where(A.titulo_id.in_(titulo_ids))
+        if acao: q = q.where(_filtro_acao(A, acao))
+        return q.order_by(A.ano, A.titulo_id)
+    # intervalo de datas arbitrário: agrega o resumo mensal
+    R = ResumoMensal
+    q = select(R.titulo_id, R.ano, _reais(func.sum(R.venda_centavos)), _reais(func.sum(R.resgate_centavos))).where(R.titulo_id.in_(titulo_ids))
+    if data_inicio: q = q.where(R.periodo >= data_inicio)
+    if data_fim: q = q.where(R.periodo <= data_fim)
+    if acao: q = q.where(_filtro_acao(R, acao))
+    return q.group_by(R.titulo_id, R.ano).order_by(R.ano, R.titulo_id)
+
+def stmt_agregado(titulo_ids: list, granularidade: str, data_inicio: Optional[date] = None, data_fim: Optional[date] = None, acao: Optional[str] = None, limite: Optional[int] = None):
+    """(titulo_id, ano, sub, valor_venda, valor_resgate) com sub = nº do mês/trimestre/semestre (1 para ano)
+
+    O agrupamento é feito no banco sobre a chave (titulo_id, periodo) do resumo mensal.
+    `limite` (paginação) só vale para a granularidade mensal.
+    """
+    if granularidade == "mes":
+        return stmt_mensal(titulo_ids, data_inicio, data_fim, acao, limite)
+    if granularidade == "ano" and data_inicio is None and data_fim is None:
+        A = ResumoAnual
+        q = select(A.titulo_id, A.ano, literal(1), _reais(A.venda_centavos), _reais(A.resgate_centavos)).where(A.titulo_id.in_(titulo_ids))
+        if acao: q = q.where(_filtro_acao(A, acao))
+        return q.order_by(A.ano, A.titulo_id)
+    R = ResumoMensal
+    sub = ((R.mes - 1) // (12 // PERIODOS_POR_ANO[granularidade]) + 1).label("sub")
+    q = select(R.titulo_id, R.ano, sub, _reais(func.sum(R.venda_centavos)), _reais(func.sum(R.resgate_centavos))).where(R.titulo_id.in_(titulo_ids))
+    if data_inicio: q = q.where(R.periodo >= data_inicio)
+    if data_fim: q = q.where(R.periodo <= data_fim)
+    if acao: q = q.where(_filtro_acao(R, acao))
+    return q.group_by(R.titulo_id, R.ano, sub).order_by(R.ano, sub, R.titulo_id)
+
+def _razao(a, b):
+    # NULL quando o denominador é zero ou não existe
+    return type_coerce(a * literal_column("1.0") / func.nullif(b, literal_column("0")), Float)
+
+def stmt_indicadores(titulo_id: int, granularidade: str = "mes", data_inicio: Optional[date] = None, data_fim: Optional[date] = None):
+    """indicadores derivados da série de um título, numa passada de funções de janela
+
+    (ano, sub, venda, resgate, fluxo_liquido, posicao_acumulada, venda_12m, resgate_12m, fluxo_12m,
+    variacao_venda_aa, variacao_resgate_aa, participacao_venda, participacao_resgate); valores em reais,
+    variações e participações como fração. Janelas móveis e comparação anual usam RANGE sobre o índice
+    do período (meses sem movimento não deslocam a janela). A posição acumulada parte do início da série
+    e a participação é sobre o total de todos os títulos no período: `data_inicio` só filtra a saída.
+    """
+    R = ResumoMensal
+    por_ano = PERIODOS_POR_ANO[granularidade]
+    if granularidade == "mes":
+        sub, venda, resgate, periodo = R.mes, R.venda_centavos, R.resgate_centavos, R.periodo
+    else:
+        sub = (R.mes - 1) // (12 // por_ano) + 1
+        venda, resgate, periodo = func.sum(R.venda_centavos), func.sum(R.resgate_centavos), func.max(R.periodo)
+    # índice contínuo do período: um único ORDER BY numérico, exigido pelo RANGE com deslocamento
+    serie = {"partition_by": R.titulo_id, "order_by": (R.ano * por_ano + sub).self_group()}
+    doze_meses = {**serie, "range_": (-(por_ano - 1), 0)}
+    ano_anterior = {**serie, "range_": (-por_ano, -por_ano)}
+    no_periodo = {"partition_by": (R.ano, sub)}
+    q = select(
+        R.titulo_id.label("titulo_id"), R.ano.label("ano"), sub.label("sub"), periodo.label("periodo"),
+        venda.label("venda"), resgate.label("resgate"),
+        func.sum(venda - resgate).over(**serie).label("posicao"),
+        func.sum(venda).over(**doze_meses).label("venda_12m"),
+        func.sum(resgate).over(**doze_meses).label("resgate_12m"),
+        func.sum(venda).over(**ano_anterior).label("venda_aa"),
+        func.sum(resgate).over(**ano_anterior).label("resgate_aa"),
+        func.sum(venda).over(**no_periodo).label("venda_total"),
+        func.sum(resgate).over(**no_periodo).label("resgate_total"),
+    )
+    if data_fim: q = q.where(R.periodo <= data_fim)
+    if granularidade != "mes":
+        q = q.group_by(R.titulo_id, R.ano, sub)
+    b = q.subquery()
+    out = select(
+        b.c.ano, b.c.sub, _reais(b.c.venda), _reais(b.c.resgate), _reais(b.c.venda - b.c.resgate), _reais(b.c.posicao),
+        _reais(b.c.venda_12m), _reais(b.c.resgate_12m), _reais(b.c.venda_12m - b.c.resgate_12m),
+        _razao(b.c.venda, b.c.venda_aa) - 1, _razao(b.c.resgate, b.c.resgate_aa) - 1,
+        _razao(b.c.venda, b.c.venda_total), _razao(b.c.resgate, b.c.resgate_total),
+    ).where(b.c.titulo_id == titulo_id)
+    if data_inicio: out = out.where(b.c.periodo >= data_inicio)
+    return out.order_by(b.c.ano, b.c.sub)
+
+def ler_mensal(db, *args, **kwargs):
+    return db.execute(stmt_mensal(*args, **kwargs)).all()
+
+def ler_anual(db, *args, **kwargs):
+    return db.execute(stmt_anual(*args, **kwargs)).all()
+
+def ler_agregado(db, *args, **kwargs):
+    return db.execute(stmt_agregado(*args, **kwargs)).all()
+
+def ler_indicadores(db, *args, **kwargs):
+    return db.execute(stmt_indicadores(*args, **kwargs)).all()
@@ -0,0 +1,119 @@
+from dataclasses import dataclass, make_dataclass
+from typing import List, Optional
+import orjson
+from fastapi.responses import Response
+
+# esquemas das respostas de leitura: dataclasses com __slots__ que o orjson serializa
+# direto (campos na ordem declarada), sem passar pelo jsonable_encoder do FastAPI
+
+ORJSON_OPCOES = orjson.OPT_SERIALIZE_NUMPY
+
+def dumps(payload) -> bytes:
+    return orjson.dumps(payload, option=ORJSON_OPCOES)
+
+class ORJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+@dataclass(slots=True)
+class ValorTitulo:
+    id: int
+    categoria_titulo: str
+    valor_venda: float
+    valor_resgate: float
+
+@dataclass(slots=True)
+class ComparacaoMes:
+    ano: int
+    mes: int
+    valores: List[ValorTitulo]
+
+@dataclass(slots=True)
+class ComparacaoAno:
+    ano: int
+    valores: List[ValorTitulo]
+
+@dataclass(slots=True)
+class PontoMes:
+    ano: int
+    mes: int
+    valor_venda: float
+    valor_resgate: float
+
+@dataclass(slots=True)
+class PontoTrimestre:
+    ano: int
+    trimestre: int
+    valor_venda: float
+    valor_resgate: float
+
+@dataclass(slots=True)
+class PontoSemestre:
+    ano: int
+    semestre: int
+    valor_venda: float
+    valor_resgate: float
+
+@dataclass(slots=True)
+class PontoAno:
+    ano: int
+    valor_venda: float
+    valor_resgate: float
+
+PONTO_POR_GRANULARIDADE = {"mes": PontoMes, "trimestre": PontoTrimestre, "semestre": PontoSemestre, "ano": PontoAno}
+
+@dataclass(slots=True)
+class Historico:
+    id: int
+    categoria_titulo: str
+    historico: list
+
+@dataclass(slots=True)
+class VendaMes:
+    ano: int
+    mes: int
+    valor_venda: float
+
+@dataclass(slots=True)
+class VendaAno:
+    ano: int
+    valor_venda: float
+
+@dataclass(slots=True)
+class ResgateMes:
+    ano: int
+    mes: int
+    valor_resgate: float
+
+@dataclass(slots=True)
+class ResgateAno:
+    ano: int
+    valor_resgate: float
+
+# (acao, group_by) -> esquema do ponto da série
+SERIE = {("venda", None): VendaMes, ("venda", "ano"): VendaAno, ("resgate", None): ResgateMes, ("resgate", "ano"): ResgateAno}
+
+# GET /titulo_tesouro/{id}/indicadores: valores em reais; variações (sobre o mesmo período do ano
+# anterior) e participações (no total de todos os títulos no período) como fração, null sem base
+_CAMPOS_INDICADOR = [
+    ("valor_venda", float), ("valor_resgate", float), ("fluxo_liquido", float), ("posicao_acumulada", float),
+    ("venda_12m", float), ("resgate_12m", float), ("fluxo_12m", float),
+    ("variacao_venda_aa", Optional[float]), ("variacao_resgate_aa", Optional[float]),
+    ("participacao_venda", Optional[float]), ("participacao_resgate", Optional[float]),
+]
+
+IndicadorMes = make_dataclass("IndicadorMes", [("ano", int), ("mes", int), *_CAMPOS_INDICADOR], slots=True)
+IndicadorTrimestre = make_dataclass("IndicadorTrimestre", [("ano", int), ("trimestre", int), *_CAMPOS_INDICADOR], slots=True)
+IndicadorSemestre = make_dataclass("IndicadorSemestre", [("ano", int), ("semestre", int), *_CAMPOS_INDICADOR], slots=True)
+IndicadorAno = make_dataclass("IndicadorAno", [("ano", int), *_CAMPOS_INDICADOR], slots=True)
+
+INDICADOR_POR_GRANULARIDADE = {"mes": IndicadorMes, "trimestre": IndicadorTrimestre, "semestre": IndicadorSemestre, "ano": IndicadorAno}
+
+@dataclass(slots=True)
+class Indicadores:
+    id: int
+    categoria_titulo: str
+    granularidade: str
+    indicadores: list
@@ -0,0 +1,129 @@
+"""snapshot de leitura em Arrow IPC compartilhado pelos workers da API (dados/titulos_tesouro.arrow)
+
+Os movimentos viram uma linha por (título, mês), com venda/resgate em colunas, no layout do
+ColumnarStore e ordenados por (titulo_id, periodo). O mapa id -> categoria dos títulos e a
+versão vão nos metadados do esquema. O arquivo é gravado sem compressão, num único record batch,
+e trocado por os.replace. Os workers o mapeiam com mmap e leem as colunas sem cópia, então N
+processos compartilham as mesmas páginas do page cache. Um leitor que ainda mapeia a versão
+anterior continua com ela até recarregar.
+"""
+import os
+import json
+import mmap
+import fcntl
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+import pyarrow as pa
+from sqlalchemy import select, func, case
+from .database import DADOS_DIR, ReadSessionLocal
+from .models import Movimento, Titulo
+from .columnar import ColumnarStore, _Snapshot
+
+SNAPSHOT_PATH = os.environ.get("TESOURO_SNAPSHOT_PATH") or os.path.join(DADOS_DIR, "titulos_tesouro.arrow")
+
+# mesmos nomes e tipos das colunas do _Snapshot do ColumnarStore (lidas sem conversão)
+ESQUEMA = pa.schema([
+    ("titulo_id", pa.int32()),
+    ("mes_idx", pa.int32()),
+    ("ano", pa.int32()),
+    ("mes", pa.int32()),
+    ("venda", pa.int64()),
+    ("resgate", pa.int64()),
+    ("n_venda", pa.int32()),
+    ("n_resgate", pa.int32()),
+])
+
+@contextmanager
+def _trava(path: str):
+    # serializa publicações concorrentes (pipeline e workers): a última troca leu o banco por último
+    with open(f"{path}.lock", "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def publicar(path: str = SNAPSHOT_PATH, session_factory=ReadSessionLocal) -> int:
+    """lê movimentos e títulos do banco e troca o snapshot de forma atômica; devolve o nº de linhas"""
+    M = Movimento
+    venda = M.acao == "venda"
+    with _trava(path):
+        with session_factory() as db:
+            rows = db.execute(select(
+                M.titulo_id, M.ano * 12 + M.mes - 1, M.ano, M.mes,
+                func.sum(case((venda, M.valor_centavos), else_=0)),
+                func.sum(case((venda, 0), else_=M.valor_centavos)),
+                func.sum(case((venda, 1), else_=0)),
+                func.sum(case((venda, 0), else_=1)),
+            ).group_by(M.titulo_id, M.periodo, M.ano, M.mes).order_by(M.titulo_id, M.periodo)).all()
+            titulos = dict(db.execute(select(Titulo.id, Titulo.categoria_titulo)).all())
+        cols = list(zip(*rows)) if rows else [()] * len(ESQUEMA)
+        # um único batch (mesmo vazio): cada coluna é um buffer contíguo no arquivo
+        batch = pa.record_batch([pa.array(c, f.type) for c, f in zip(cols, ESQUEMA)], schema=ESQUEMA.with_metadata({
+            b"titulos": json.dumps(titulos).encode(),
+            b"versao": datetime.now().isoformat().encode(),
+        }))
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with pa.OSFile(tmp, "wb") as f, pa.ipc.new_file(f, batch.schema) as w:
+            w.write_batch(batch)
+        os.replace(tmp, path)
+    return batch.num_rows
+
+def _chave(st: os.stat_result) -> tuple:
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+def _coluna(batch: pa.RecordBatch, nome: str) -> np.ndarray:
+    # sem nulos e tipo primitivo: a view NumPy aponta direto para as páginas mapeadas
+    return batch.column(nome).to_numpy(zero_copy_only=True)
+
+class SnapshotStore(ColumnarStore):
+    """ColumnarStore cujas colunas são views NumPy sobre o snapshot Arrow mapeado em memória
+
+    A cada leitura compara o arquivo (inode, mtime, tamanho) com o mapeado e remapeia se mudou:
+    as cargas do pipeline e as publicações de outros workers aparecem sem aviso. `invalidar()`
+    (escrita por este worker) republica o snapshot a partir do banco antes da próxima leitura.
+    Sem o arquivo, a primeira leitura o publica.
+    """
+
+    def __init__(self, path: str = SNAPSHOT_PATH, session_factory=ReadSessionLocal):
+        super().__init__(session_factory)
+        self.path = path
+        self._chave = None
+        self.titulos = {}
+        # o arquivo em disco vale como a versão atual até a primeira escrita deste worker
+        self._versao_carregada = self.versao
+
+    def recarregar(self):
+        # nova carga do pipeline: o snapshot já foi republicado por ele e a troca é detectada pelo stat
+        pass
+
+    def _carregar(self) -> _Snapshot:
+        with open(self.path, "rb") as f:
+            self._chave = _chave(os.fstat(f.fileno()))
+            mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        leitor = pa.ipc.open_file(pa.BufferReader(pa.py_buffer(mapa)))
+        batch = leitor.get_batch(0)
+        self.titulos = {int(k): v for k, v in json.loads(leitor.schema.metadata[b"titulos"]).items()}
+        s = _Snapshot()
+        for nome in ESQUEMA.names:
+            setattr(s, nome, _coluna(batch, nome))
+        ids, inicio = np.unique(s.titulo_id, return_index=True)
+        fim = np.append(inicio[1:], len(s.titulo_id))
+        s.inicio = {int(t): (int(a), int(b)) for t, a, b in zip(ids, inicio, fim)}
+        return s
+
+    def snapshot(self) -> _Snapshot:
+        with self._lock:
+            try:
+                atual = _chave(os.stat(self.path))
+            except FileNotFoundError:
+                atual = None
+            if self._versao_carregada != self.versao or atual is None:
+                versao = self.versao
+                publicar(self.path, self._session_factory)
+                self._versao_carregada = versao
+                atual = _chave(os.stat(self.path))
+            if self._snap is None or atual != self._chave:
+                self._snap = self._carregar()
+            return self._snap
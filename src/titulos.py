@@ -0,0 +1,9 @@
+# ids fixos dos títulos (tabela `titulos`); módulo sem dependências para a API não carregar pandas
+TITULOS_ID_MAP = {
+    "LTN": 1,
+    "LFT": 2,
+    "NTN-B": 3,
+    "NTN-B Principal": 4,
+    "NTN-C": 5,
+    "NTN-F": 6,
+}
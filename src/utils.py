@@ -1,14 +1,18 @@
+import os
+import zipfile
+import hashlib
+import importlib.util
+import xml.etree.ElementTree as ET
+import numpy as np
 import pandas as pd
 import re
+from .instrumentacao import Etapas
+from .titulos import TITULOS_ID_MAP
 
-TITULOS_ID_MAP = {
-    "LTN": 1,
-    "LFT": 2,
-    "NTN-B": 3,
-    "NTN-B Principal": 4,
-    "NTN-C": 5,
-    "NTN-F": 6,
-}
+
+# categorias dos campos categóricos do DataFrame tidy
+CATEGORIAS = list(TITULOS_ID_MAP)
+ACOES = ["venda", "resgate"]
 
 def _clean_colname(c: str) -> str:
     """remove espaços invisíveis e padroniza texto"""
@@ -16,55 +20,151 @@ def _clean_colname(c: str) -> str:
     c = re.sub(r"\s+", " ", c)
     return c.strip()
 
-def read_and_transform_excel(path: str) -> pd.DataFrame:
-    xls = pd.ExcelFile(path)
-    df = pd.read_excel(path, sheet_name=xls.sheet_names[0])
-    df.columns = [_clean_colname(c) for c in df.columns]
-    df = df.rename(columns={df.columns[1]: "periodo"})
-
-    # mapear colunas “venda/resgate” -> (ação, categoria)
-    colmap = {}
-    for c in df.columns[2:]:
-        base = _clean_colname(c)
-        base = re.sub(r"Nome da série: ?", "", base)
-        base = re.sub(r"Periodicidade:.*$", "", base)
-        base = re.sub(r"Unidade:.*$", "", base)
-        base = re.sub(r"Data de atualização:.*$", "", base)
-        base = base.replace("Fonte: Tesouro Nacional", "").strip()
-
-        if "Vendas - Tesouro Direto -" in base:
-            acao = "venda"
-            categoria = base.split("Vendas - Tesouro Direto -", 1)[1].strip()
-        elif "Resgates - Tesouro Direto -" in base:
-            acao = "resgate"
-            categoria = base.split("Resgates - Tesouro Direto -", 1)[1].strip()
-        else:
-            acao = "venda" if "Vendas" in base else ("resgate" if "Resgates" in base else "venda")
-            categoria = base.split("-")[-1].strip()
-
-        colmap[c] = (acao, categoria)
-
-    df["periodo"] = pd.to_datetime(df["periodo"]).dt.to_period("M").dt.to_timestamp()
-
-    long_df = df.melt(id_vars=["periodo"], value_vars=list(colmap.keys()),
-                      var_name="serie", value_name="valor_milhoes")
-
-    long_df["acao"] = long_df["serie"].map(lambda s: colmap[s][0])
-    long_df["categoria_titulo"] = long_df["serie"].map(lambda s: colmap[s][1])
-
-    # normaliza espaços em categoria (ex: “NTN-B Principal ”)
-    long_df["categoria_titulo"] = long_df["categoria_titulo"].str.strip()
-
-    # filtra apenas as categorias conhecidas
-    long_df = long_df[long_df["categoria_titulo"].isin(TITULOS_ID_MAP.keys())].copy()
-
-    long_df["valor_milhoes"] = pd.to_numeric(long_df["valor_milhoes"], errors="coerce").fillna(0.0)
-    long_df["valor_reais"] = long_df["valor_milhoes"] * 1_000_000
-    long_df["ano"] = long_df["periodo"].dt.year
-    long_df["mes"] = long_df["periodo"].dt.month
-    long_df["titulo_id"] = long_df["categoria_titulo"].map(TITULOS_ID_MAP)
-
-    long_df = long_df[(long_df["valor_milhoes"] >= 0) & long_df["titulo_id"].notnull()]
-
-    cols = ["titulo_id","categoria_titulo","periodo","ano","mes","acao","valor_milhoes","valor_reais"]
-    return long_df[cols].reset_index(drop=True)
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """hash do conteúdo do arquivo (independe de mtime/cópia)"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloco in iter(lambda: f.read(chunk_size), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+def _serie_meta(c: str) -> tuple:
+    """(ação, categoria) a partir do nome da série; ação None para séries que não são de venda/resgate"""
+    base = _clean_colname(c)
+    base = re.sub(r"Nome da série: ?", "", base)
+    base = re.sub(r"Periodicidade:.*$", "", base)
+    base = re.sub(r"Unidade:.*$", "", base)
+    base = re.sub(r"Data de atualização:.*$", "", base)
+    base = base.replace("Fonte: Tesouro Nacional", "").strip()
+
+    if "Vendas - Tesouro Direto -" in base:
+        acao = "venda"
+        categoria = base.split("Vendas - Tesouro Direto -", 1)[1].strip()
+    elif "Resgates - Tesouro Direto -" in base:
+        acao = "resgate"
+        categoria = base.split("Resgates - Tesouro Direto -", 1)[1].strip()
+    else:
+        # outras séries (estoque, investidores...) ficam de fora em vez de virar venda
+        acao = "venda" if "Vendas" in base else ("resgate" if "Resgates" in base else None)
+        categoria = base.split("-")[-1].strip()
+    return acao, categoria
+
+def centavos(df: pd.DataFrame) -> np.ndarray:
+    """valor_reais do frame tidy em centavos inteiros (formato gravado no banco e no dataset)"""
+    return np.rint(df["valor_reais"].to_numpy(dtype=np.float64) * 100).astype(np.int64)
+
+def excel_engine() -> str:
+    """calamine (Rust) quando instalado; senão openpyxl, que o pandas já abre em modo read-only"""
+    return "calamine" if importlib.util.find_spec("python_calamine") else "openpyxl"
+
+def planilhas(path: str) -> list:
+    """nomes das planilhas na ordem do arquivo; no xlsx lê só o xl/workbook.xml, sem abrir as planilhas"""
+    try:
+        with zipfile.ZipFile(path) as z:
+            raiz = ET.fromstring(z.read("xl/workbook.xml"))
+        return [el.get("name") for el in raiz.iterfind(".//{*}sheet")]
+    except (zipfile.BadZipFile, KeyError, ET.ParseError):
+        return pd.ExcelFile(path).sheet_names
+
+def _cache_path(path: str, sheet: int = 0) -> str:
+    pasta, nome = os.path.split(os.path.abspath(path))
+    sufixo = f".{sheet}" if sheet else ""
+    return os.path.join(pasta, f".{os.path.splitext(nome)[0]}{sufixo}.cache.parquet")
+
+def _read_cache(cache: str, path: str, sha256: str = None):
+    import pyarrow.parquet as pq
+    meta = pq.read_schema(cache).metadata or {}
+    st = os.stat(path)
+    mtime_ok = meta.get(b"mtime_ns") == str(st.st_mtime_ns).encode() and meta.get(b"size") == str(st.st_size).encode()
+    # mtime diferente (ex: cópia/touch) ainda é hit se o conteúdo for o mesmo
+    if not mtime_ok and (sha256 or file_sha256(path)).encode() != meta.get(b"sha256"):
+        return None
+    return pq.read_table(cache).to_pandas()
+
+def _write_cache(cache: str, path: str, df: pd.DataFrame, sha256: str = None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    st = os.stat(path)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"mtime_ns": str(st.st_mtime_ns).encode(),
+        b"size": str(st.st_size).encode(),
+        b"sha256": (sha256 or file_sha256(path)).encode(),
+    })
+    tmp = f"{cache}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp)
+    os.replace(tmp, cache)
+
+def read_excel_sheet(path: str, cache: bool = True, sha256: str = None, sheet: int = 0, etapas: Etapas = None) -> pd.DataFrame:
+    """lê a planilha de índice `sheet` uma única vez; com cache, re-execuções usam o Parquet ao lado do xlsx"""
+    etapas = etapas or Etapas()
+    rotulos = {"arquivo": os.path.basename(path), "planilha": sheet}
+    cache_file = _cache_path(path, sheet)
+    if cache and os.path.exists(cache_file):
+        with etapas.etapa("cache_leitura", **rotulos) as reg:
+            try:
+                df = _read_cache(cache_file, path, sha256)
+            except (ImportError, OSError, ValueError):
+                df = None
+            reg["linhas_saida"] = None if df is None else len(df)
+        if df is not None:
+            return df
+    with etapas.etapa("excel", **rotulos) as reg:
+        df = pd.read_excel(path, sheet_name=sheet, engine=excel_engine())
+        reg["linhas_saida"] = len(df)
+    if cache:
+        with etapas.etapa("cache_gravacao", len(df), **rotulos):
+            try:
+                _write_cache(cache_file, path, df, sha256)
+            except (ImportError, OSError, ValueError):
+                pass
+    return df
+
+def read_and_transform_excel(path: str, cache: bool = True, sha256: str = None, sheet: int = 0, etapas: Etapas = None) -> pd.DataFrame:
+    etapas = etapas or Etapas()
+    rotulos = {"arquivo": os.path.basename(path), "planilha": sheet}
+    df = read_excel_sheet(path, cache=cache, sha256=sha256, sheet=sheet, etapas=etapas)
+    with etapas.etapa("series", df.shape[1], **rotulos) as reg:
+        df.columns = [_clean_colname(str(c)) for c in df.columns]
+        # metadados resolvidos uma vez por coluna (não por linha do melt)
+        colmap = {c: _serie_meta(c) for c in df.columns[2:]}
+        series = [c for c, (acao, cat) in colmap.items() if acao and cat in TITULOS_ID_MAP]
+        meta = [colmap[c] for c in series]
+        n_series = reg["linhas_saida"] = len(series)
+    with etapas.etapa("melt", len(df) * n_series, **rotulos) as reg:
+        long_df = _melt(df, series, meta)
+        reg["linhas_saida"] = len(long_df)
+    return long_df
+
+def _melt(df: pd.DataFrame, series: list, meta: list) -> pd.DataFrame:
+    """bloco períodos x séries -> frame tidy (uma linha por período/série)"""
+    n_series = len(series)
+    if n_series:
+        df = df.rename(columns={df.columns[1]: "periodo"})
+    else:
+        # planilha sem séries de venda/resgate dos títulos conhecidos (notas, outras séries): frame vazio
+        df = pd.DataFrame({"periodo": pd.Series(dtype="datetime64[ns]")})
+
+    periodo = pd.to_datetime(df["periodo"]).dt.to_period("M").dt.to_timestamp()
+    n_periodos = len(periodo)
+
+    # bloco numérico (períodos x séries) achatado por coluna: mesma ordem do melt
+    bloco = df[series].apply(pd.to_numeric, errors="coerce").to_numpy(dtype="float64")
+    valor_milhoes = np.nan_to_num(bloco.ravel(order="F"), nan=0.0)
+
+    titulo_id = np.repeat(np.array([TITULOS_ID_MAP[cat] for _, cat in meta], dtype="int8"), n_periodos)
+    acao_cod = np.repeat(np.array([ACOES.index(acao) for acao, _ in meta], dtype="int8"), n_periodos)
+    cat_cod = np.repeat(np.array([CATEGORIAS.index(cat) for _, cat in meta], dtype="int8"), n_periodos)
+
+    long_df = pd.DataFrame({
+        "titulo_id": titulo_id,
+        "categoria_titulo": pd.Categorical.from_codes(cat_cod, categories=CATEGORIAS),
+        "periodo": np.tile(periodo.to_numpy(), n_series),
+        "ano": np.tile(periodo.dt.year.to_numpy(dtype="int16"), n_series),
+        "mes": np.tile(periodo.dt.month.to_numpy(dtype="int8"), n_series),
+        "acao": pd.Categorical.from_codes(acao_cod, categories=ACOES),
+        "valor_milhoes": valor_milhoes,
+        "valor_reais": valor_milhoes * 1_000_000,
+    })
+    return long_df[valor_milhoes >= 0].reset_index(drop=True)
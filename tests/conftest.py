@@ -0,0 +1,37 @@
+"""banco SQLite temporário para os testes
+
+As variáveis de ambiente precisam valer antes do primeiro import de `src` (o engine lê
+TESOURO_DB_URL no import), por isso são definidas aqui, no carregamento do conftest.
+"""
+import os
+import shutil
+import tempfile
+import pytest
+
+DIR = tempfile.mkdtemp(prefix="tesouro-testes-")
+DB_URL = f"sqlite:///{os.path.join(DIR, 'data.db')}"
+
+os.environ.update({
+    "TESOURO_DB_URL": DB_URL,
+    "TESOURO_DB_READ_URL": DB_URL,
+    "TESOURO_DATASET_PATH": os.path.join(DIR, "dataset"),
+    "TESOURO_SNAPSHOT_PATH": os.path.join(DIR, "snapshot.arrow"),
+    "TESOURO_API_MODE": "sync",
+    "TESOURO_READ_ENGINE": "sql",
+})
+
+@pytest.fixture(scope="session")
+def banco():
+    """esquema (via make_engine + preparar_banco) e os títulos conhecidos; devolve a URL"""
+    from sqlalchemy import insert
+    from src.database import make_engine
+    from src.migrations import preparar_banco
+    from src.models import Titulo
+    from src.titulos import TITULOS_ID_MAP
+    eng = make_engine(DB_URL)
+    preparar_banco(eng)
+    with eng.begin() as conn:
+        conn.execute(insert(Titulo.__table__), [{"id": i, "categoria_titulo": nome} for nome, i in TITULOS_ID_MAP.items()])
+    eng.dispose()
+    yield DB_URL
+    shutil.rmtree(DIR, ignore_errors=True)